@@ -332,6 +332,31 @@ const plugin: JupyterFrontEndPlugin<void> = {
 
 
 
+    /* Push the active cell to the host whenever it changes, so the AS does not
+       have to ask for it. Edits are debounced. */
+    let pushTimer: ReturnType<typeof setTimeout> | undefined;
+    const notifyActiveCellChanged = (): void => {
+      clearTimeout(pushTimer);
+      pushTimer = setTimeout(() => {
+        const model = notebookTracker.currentWidget?.content.activeCell?.model as CellModel;
+        if (!model) {
+          return;
+        }
+        const message = { type: 'from-iframe-to-host',
+          task: "activeCellChanged",
+          ActiveCellContent: model.sharedModel.getSource(),
+          ActiveCellType: model.sharedModel.cell_type };
+        window.parent.postMessage(message, '*');
+      }, 300);
+    };
+    let watchedCell: CellModel | undefined;
+    notebookTracker.activeCellChanged.connect((_, cell) => {
+      watchedCell?.contentChanged.disconnect(notifyActiveCellChanged);
+      watchedCell = cell?.model as CellModel | undefined;
+      watchedCell?.contentChanged.connect(notifyActiveCellChanged);
+      notifyActiveCellChanged();
+    });
+
     /* Incoming messages management */
     window.addEventListener('message', (event) => {
       if (event.data.type === 'from-host-to-iframe') {
@@ -0,0 +1,306 @@
+"""Offline benchmark of the PyTeach agent graph.
+
+Ollama is replaced by TestListChatModel (realistic per-token delays), the
+notebook socket.io bridge and the textbook RAG by stubs with a configurable
+latency, so the whole graph runs without any network access.
+
+Usage:
+    python benchmark.py --requests 50 --concurrency 8
+    python benchmark.py --task-type teach --speculative --output-guard incremental
+"""
+import os
+import json
+import time
+import uuid
+import asyncio
+import argparse
+import tempfile
+
+from collections import Counter, defaultdict
+from typing import Any, Optional
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.messages import AIMessageChunk, ToolMessage
+from langchain_core.outputs import ChatGenerationChunk
+from langchain_core.runnables import RunnableLambda
+
+from pyteach.agent import PyTeachWorkflow
+from pyteach.utils import get_logger, nodes, tools
+from pyteach.utils.memory import LazyAsyncSqliteSaver
+from pyteach.utils.prebuilt import TestListChatModel
+from pyteach.utils.rag_tool import RAG
+
+logger = get_logger()
+
+TEACHER_ANSWER = (
+    "A variable is like a box with a name. You can put a value in the box, "
+    "for example a number or a word, and use the name later to get it back. "
+    "Try it: write x = 3 and then print(x) in the next cell!")
+
+
+class BenchmarkChatModel(TestListChatModel):
+    """TestListChatModel that can stand in for every agent of the graph.
+
+    With `tool_name` set, the model first requests that tool and answers once
+    the tool result is back. The choice is made from the messages, not from
+    the shared response cycle, so concurrent chats do not interfere.
+    """
+
+    tool_name: Optional[str] = None
+
+    def bind_tools(self, tools, **kwargs):
+        return self
+
+    def with_structured_output(self, schema, **kwargs):
+        return RunnableLambda(lambda _: schema())
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        if self.tool_name and not isinstance(messages[-1], ToolMessage):
+            await asyncio.sleep(self.sleep or 0)
+            yield ChatGenerationChunk(message=AIMessageChunk(
+                content="",
+                tool_call_chunks=[{
+                    "name": self.tool_name,
+                    "args": "{}",
+                    "id": f"call_{uuid.uuid4().hex}",
+                    "index": 0,
+                }]))
+            return
+        async for chunk in super()._astream(messages, stop, run_manager,
+                                            **kwargs):
+            yield chunk
+
+
+class NodeTimer(BaseCallbackHandler):
+    """Collect the duration of every graph node run."""
+
+    run_inline = True
+
+    def __init__(self):
+        self.started: dict[uuid.UUID, tuple[str, float]] = {}
+        self.durations: dict[str, list[float]] = defaultdict(list)
+
+    def on_chain_start(self, serialized, inputs, *, run_id, metadata=None,
+                       **kwargs: Any):
+        name = kwargs.get("name")
+        if metadata and metadata.get("langgraph_node") == name:
+            self.started[run_id] = (name, time.perf_counter())
+
+    def _stop(self, run_id):
+        if run_id in self.started:
+            name, start = self.started.pop(run_id)
+            self.durations[name].append(time.perf_counter() - start)
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs: Any):
+        self._stop(run_id)
+
+    def on_chain_error(self, error, *, run_id, **kwargs: Any):
+        self._stop(run_id)
+
+
+def timed_checkpointer(db_path: str):
+    """A sqlite checkpointer that records how long each operation takes."""
+    saver = LazyAsyncSqliteSaver(db_path)
+    durations = defaultdict(list)
+
+    def timed(name, method):
+
+        async def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return await method(*args, **kwargs)
+            finally:
+                durations[name].append(time.perf_counter() - start)
+
+        return wrapper
+
+    for name in ("aget_tuple", "aput", "aput_writes"):
+        setattr(saver, name, timed(name, getattr(saver, name)))
+    return saver, durations
+
+
+def install_stubs(args):
+    """Swap Ollama, socket.io and RAG for offline stand-ins."""
+    guard = BenchmarkChatModel(responses=["safe"], sleep=args.token_delay)
+    teacher = BenchmarkChatModel(
+        responses=[TEACHER_ANSWER],
+        sleep=args.token_delay,
+        tool_name=None if args.no_tools else "get_user_codes")
+    plain = BenchmarkChatModel(responses=[TEACHER_ANSWER],
+                               sleep=args.token_delay)
+
+    def get_model(agent_name, base_url=None, tools=None, **kwargs):
+        if "guard" in agent_name:
+            return guard
+        return teacher if tools else plain
+
+    async def aensure(name):
+        return
+
+    async def get_what_user_is_reading(thread_id=None):
+        await asyncio.sleep(args.tool_latency)
+        return {
+            "jupyterlite_info": {
+                "ActiveCellContent": "x = 3\nprint(x)",
+                "ActiveCellType": "code",
+            }
+        }
+
+    async def write_codes_to_new_cell(codes, client_id=None):
+        await asyncio.sleep(args.tool_latency)
+        return {"message": "Successfully write content to a new cell."}
+
+    async def rag_function(query):
+        await asyncio.sleep(args.tool_latency)
+        return RAG.RAG_template + "1. A variable stores a value.\n" + query
+
+    nodes.get_model = get_model
+    nodes.agent_registry.aensure = aensure
+    # The graph runs the tools' native async implementations
+    tools._aget_what_user_is_reading = get_what_user_is_reading
+    tools._awrite_codes_to_new_cell = write_codes_to_new_cell
+    RAG.arag_function = rag_function
+
+
+def percentiles(values: list[float]) -> dict:
+    values = sorted(values)
+    if not values:
+        return {}
+
+    def pick(q):
+        return values[min(len(values) - 1, int(q * len(values)))]
+
+    return {
+        "count": len(values),
+        "p50_ms": pick(0.50) * 1000,
+        "p95_ms": pick(0.95) * 1000,
+        "p99_ms": pick(0.99) * 1000,
+        "total_s": sum(values),
+    }
+
+
+async def run_benchmark(args) -> dict:
+    install_stubs(args)
+    db_dir = tempfile.mkdtemp(prefix="pyteach-benchmark-")
+    checkpointer, checkpoint_durations = timed_checkpointer(
+        os.path.join(db_dir, "checkpoints.sqlite"))
+    agent = PyTeachWorkflow.compile(checkpointer=checkpointer)
+    nodes.guard_verdict_cache.clear()
+
+    timer = NodeTimer()
+    semaphore = asyncio.Semaphore(args.concurrency)
+    latencies = []
+    # "<type>: <message>" of every failed request, with its count
+    errors = Counter()
+
+    async def chat(i: int):
+        config = {
+            "configurable": {
+                "thread_id": f"benchmark-{i % args.threads}",
+                "speculative": args.speculative,
+                "output_guard": args.output_guard,
+            },
+            "callbacks": [timer],
+        }
+        input_state = {
+            "user_input": f"{args.input} ({i})",
+            "task_type": args.task_type,
+        }
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                # "messages" attaches a streaming handler, like /chat/stream,
+                # so the fake models emit tokens with realistic delays
+                async for _ in agent.astream(
+                        input_state,
+                        config=config,
+                        stream_mode=["updates", "messages"]):
+                    pass
+            except Exception as e:
+                message = f"{type(e).__name__}: {e}"
+                if not errors:
+                    # The traceback of the first failure, the rest are counted
+                    logger.exception(f"Benchmark request {i} failed")
+                errors[message] += 1
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(chat(i) for i in range(args.requests)))
+    elapsed = time.perf_counter() - start
+    await checkpointer.aclose()
+
+    return {
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "errors": sum(errors.values()),
+        "error_messages": dict(errors.most_common()),
+        "elapsed_s": elapsed,
+        "throughput_rps": args.requests / elapsed,
+        "latency": percentiles(latencies),
+        "nodes": {
+            name: percentiles(values)
+            for name, values in timer.durations.items()
+        },
+        "checkpoint": {
+            name: percentiles(values)
+            for name, values in checkpoint_durations.items()
+        },
+    }
+
+
+def print_report(report: dict):
+    print(f"requests={report['requests']} "
+          f"concurrency={report['concurrency']} errors={report['errors']} "
+          f"elapsed={report['elapsed_s']:.2f}s "
+          f"throughput={report['throughput_rps']:.2f} req/s")
+    header = f"{'':<28}{'count':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+    rows = [("end-to-end", report["latency"])]
+    rows += [(f"node: {name}", stats)
+             for name, stats in report["nodes"].items()]
+    rows += [(f"checkpoint: {name}", stats)
+             for name, stats in report["checkpoint"].items()]
+    print(header)
+    for name, stats in rows:
+        print(f"{name:<28}{stats['count']:>7}{stats['p50_ms']:>10.1f}"
+              f"{stats['p95_ms']:>10.1f}{stats['p99_ms']:>10.1f}")
+    for message, count in report["error_messages"].items():
+        print(f"error x{count}: {message}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--threads",
+                        type=int,
+                        default=4,
+                        help="number of distinct chat threads")
+    parser.add_argument("--input", default="What is a variable?")
+    parser.add_argument("--task-type", default="default_task")
+    parser.add_argument("--speculative", action="store_true")
+    parser.add_argument("--output-guard",
+                        default="full",
+                        choices=["full", "incremental"])
+    parser.add_argument("--no-tools",
+                        action="store_true",
+                        help="the teacher answers without calling a tool")
+    parser.add_argument("--token-delay",
+                        type=float,
+                        default=0.01,
+                        help="base delay per token of the fake models (s)")
+    parser.add_argument("--tool-latency",
+                        type=float,
+                        default=0.05,
+                        help="latency of the stubbed tools (s)")
+    parser.add_argument("--json", help="also write the report to this file")
+    args = parser.parse_args()
+
+    report = asyncio.run(run_benchmark(args))
+    print_report(report)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -19,6 +19,8 @@
 
 # %%
 import os
+import asyncio
+import threading
 from dotenv import load_dotenv
 from pyteach.agent import agent
 from pyteach.utils.config import GraphConfig
@@ -40,6 +42,15 @@ except Exception as err:
 # Environment and API Key
 load_dotenv(".env")
 
+# The graph nodes are coroutines. Drive them on one background event loop so
+# the cells below work the same in Jupyter and in a plain interpreter.
+loop = asyncio.new_event_loop()
+threading.Thread(target=loop.run_forever, daemon=True).start()
+
+
+def run(coro):
+    return asyncio.run_coroutine_threadsafe(coro, loop).result()
+
 # %%
 from pyteach.agent import InputGuard
 from langgraph.types import Interrupt
@@ -66,22 +77,26 @@ def namespace_parser(namespace:tuple) -> str:
         raise Exception("Strange!!!")
             
 
-for namespace, event in agent.stream(input_state,
-                          config=config,
-                          stream_mode="updates",
-                          subgraphs=True):
-    # logger.debug(f"Update from {namespace}: {event}")
-    for node, update in event.items():
-        logger.debug(f"Update from {node}: {update}")
-        if node == "__interrupt__":
-            print(f"\n{namespace_parser(namespace)}")
-            update[0].value.pretty_print()
-        else:
-            if update:
-                for key, value in update.items():
-                    if "messages" in key and update[key]:
-                        print(f"\n{namespace_parser(namespace)}")
-                        update[key][-1].pretty_print()
+async def stream_agent(input_state, config):
+    async for namespace, event in agent.astream(input_state,
+                                                config=config,
+                                                stream_mode="updates",
+                                                subgraphs=True):
+        # logger.debug(f"Update from {namespace}: {event}")
+        for node, update in event.items():
+            logger.debug(f"Update from {node}: {update}")
+            if node == "__interrupt__":
+                print(f"\n{namespace_parser(namespace)}")
+                update[0].value.pretty_print()
+            else:
+                if update:
+                    for key, value in update.items():
+                        if "messages" in key and update[key]:
+                            print(f"\n{namespace_parser(namespace)}")
+                            update[key][-1].pretty_print()
+
+
+run(stream_agent(input_state, config))
 
     # Deprecated:
     # We only stream out the AIMessageChunk and AIMessage from ["Interruption Handler", "Output Handler"]
@@ -94,18 +109,18 @@ for namespace, event in agent.stream(input_state,
 
 # %%
 config = {"configurable": {"thread_id": 0}}
-agent.get_state(config=config)
+run(agent.aget_state(config=config))
 
 # %%
 config = {"configurable": {"thread_id": 0}}
-for key in agent.get_state(config=config).values:
+for key in run(agent.aget_state(config=config)).values:
     print(key)
 
 # %%
 clean_memory_by_thread(thread_id)
 
 # %%
-from pyteach.utils.nodes import create_agent
+from pyteach.utils.models import create_agent
 
 create_agent(agent_name="input_guard", system_prompt="", model="llama-guard3:8b")
 
@@ -135,7 +150,7 @@ from pyteach.utils.nodes import task_detection
 # print(task_detection("can you explain the codes on the left?")) # explain all materials
 # print(task_detection("can you explain the highlighted codes?")) # explain all materials
 # print(task_detection("can you comment the codes?")) # comment codes
-print(task_detection("can you fix the codes?")) # debug all codes
-print(task_detection("""can you fix this: print("hello world')""")) # simple debug
+print(run(task_detection("can you fix the codes?"))) # debug all codes
+print(run(task_detection("""can you fix this: print("hello world')"""))) # simple debug
 
 
@@ -1,15 +1,15 @@
 from langgraph.graph import StateGraph, END, START
 
-from pyteach.utils import get_sql_checkpointer
+from pyteach.utils import get_async_sql_checkpointer
 from pyteach.utils.nodes import (
     teacher, teacher_tool_calling_router, teacher_toolkit, init_teacher,
     init_input_guard, input_guard_judgement, input_interruption_handler,
     input_guard_router, input_guard_to_teacher, init_output_guard,
     output_guard_judgement, output_interruption_handler, output_guard_router,
-    output_guard_to_user)
+    output_guard_to_user, workflow_router, speculative_guard_and_teacher)
 from pyteach.utils.state import (TeacherState, GlobalInputState,
                                  InputGuardState, GlobalOutputState,
-                                 OutputGuardState)
+                                 OutputGuardState, SpeculativeTeacherState)
 from pyteach.utils.config import GraphConfig
 
 # ======================================================================================
@@ -64,6 +64,40 @@ Teacher.add_conditional_edges(
 Teacher.add_edge("Toolkit", "LLM Teacher")
 Teacher = Teacher.compile()
 
+# ======================================================================================
+# ============================== Speculative Teacher ===================================
+# ======================================================================================
+# Input Guard + Teacher in one subgraph: the guard judgement runs concurrently
+# with the teacher init and first generation, see speculative_guard_and_teacher
+SpeculativeTeacher = StateGraph(config_schema=GraphConfig,
+                                input=SpeculativeTeacherState,
+                                output=TeacherState)
+SpeculativeTeacher.add_node("Guard and Teacher",
+                            speculative_guard_and_teacher,
+                            input=SpeculativeTeacherState)
+SpeculativeTeacher.add_node("LLM Teacher", teacher, input=TeacherState)
+SpeculativeTeacher.add_node("Toolkit", teacher_toolkit)
+
+SpeculativeTeacher.add_edge(START, "Guard and Teacher")
+SpeculativeTeacher.add_conditional_edges(
+    "Guard and Teacher",
+    teacher_tool_calling_router,
+    {
+        "tool_calling": "Toolkit",
+        "output": END,
+    },
+)
+SpeculativeTeacher.add_conditional_edges(
+    "LLM Teacher",
+    teacher_tool_calling_router,
+    {
+        "tool_calling": "Toolkit",
+        "output": END,
+    },
+)
+SpeculativeTeacher.add_edge("Toolkit", "LLM Teacher")
+SpeculativeTeacher = SpeculativeTeacher.compile()
+
 # ======================================================================================
 # =================================== Output Guard =====================================
 # ======================================================================================
@@ -101,16 +135,24 @@ PyTeachWorkflow = StateGraph(config_schema=GraphConfig,
                              output=GlobalOutputState)
 PyTeachWorkflow.add_node("Input Guard", InputGuard, input=InputGuardState)
 PyTeachWorkflow.add_node("Teacher", Teacher, input=TeacherState)
+PyTeachWorkflow.add_node("Speculative Teacher",
+                         SpeculativeTeacher,
+                         input=SpeculativeTeacherState)
 PyTeachWorkflow.add_node("Output Guard", OutputGuard, input=OutputGuardState)
 
-PyTeachWorkflow.add_edge(START, "Input Guard")
+PyTeachWorkflow.add_conditional_edges(START, workflow_router, {
+    "sequential": "Input Guard",
+    "speculative": "Speculative Teacher",
+})
 PyTeachWorkflow.add_edge("Input Guard", "Teacher")
 PyTeachWorkflow.add_edge("Teacher", "Output Guard")
+PyTeachWorkflow.add_edge("Speculative Teacher", "Output Guard")
 PyTeachWorkflow.add_edge("Output Guard", END)
 
 # PyTeachWorkflow.add_edge(START, "Teacher")
 # PyTeachWorkflow.add_edge("Teacher", END)
 
-memory = get_sql_checkpointer()
+# Nodes are coroutines, so the graph must be driven by `astream`/`ainvoke`
+memory = get_async_sql_checkpointer()
 # memory = MemorySaver()
 agent = PyTeachWorkflow.compile(checkpointer=memory)
@@ -1,3 +1,3 @@
 # flake8: noqa
 from pyteach.utils.logging import get_logger
-from pyteach.utils.memory import get_sql_checkpointer, clean_memory_by_thread, get_existing_memory_thread_ids
\ No newline at end of file
+from pyteach.utils.memory import get_sql_checkpointer, get_async_sql_checkpointer, clean_memory_by_thread, get_existing_memory_thread_ids
\ No newline at end of file
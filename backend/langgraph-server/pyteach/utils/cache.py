@@ -0,0 +1,74 @@
+import time
+import hashlib
+
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+
+def normalize_text(text: str) -> str:
+    return " ".join(text.lower().split())
+
+
+def text_key(*parts: str) -> str:
+    """Hash of the normalized parts, e.g. (model, text)."""
+    content = "\x1f".join(normalize_text(part) for part in parts)
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+class LRUCache:
+    """Bounded in-memory cache with least-recently-used and TTL eviction.
+
+    Args:
+        maxsize: maximum number of entries, the least recently used entry is
+            evicted first.
+        ttl: seconds an entry stays valid, None for no expiry.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: Optional[float] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._data.get(key)
+        if entry is not None and self.ttl is not None and time.monotonic(
+        ) - entry[0] > self.ttl:
+            del self._data[key]
+            self.evictions += 1
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def set(self, key: Hashable, value: Any):
+        self._data[key] = (time.monotonic(), value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._data
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def clear(self):
+        self._data.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+        }
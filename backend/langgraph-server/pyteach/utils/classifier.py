@@ -0,0 +1,221 @@
+import os
+import re
+import json
+import math
+import asyncio
+import threading
+
+from collections import Counter, defaultdict
+from typing import Optional
+
+from pyteach.utils.logging import get_logger
+from pyteach.utils.memory import get_db_path
+
+logger = get_logger()
+
+# Inputs labelled by the LLM task detector, one JSON object per line
+TASK_DETECTION_LOG = "task_detection.jsonl"
+# Student inputs are only logged and learned from when enabled, since
+# anything in the log ends up steering the classifier
+TASK_DETECTION_LEARN = os.getenv("PYTEACH_TASK_DETECTION_LOG", "0") == "1"
+# The log is rotated to <log>.1 past this many bytes, so at most twice that
+# is kept and loaded at startup
+TASK_DETECTION_LOG_SIZE = int(
+    os.getenv("PYTEACH_TASK_DETECTION_LOG_SIZE", str(1 << 20)))
+
+# Words that can trigger a task routine. Inputs without any of them are
+# "unknown" for sure, which is the answer for most chat messages.
+ROUTINE_WORDS = re.compile(
+    r"\b(explain\w*|comment\w*|annotat\w*|debug\w*|fix\w*|revis\w*|correct\w*|"
+    r"errors?|bugs?|wrong)\b")
+CODE_PATTERN = re.compile(r"[=()\[\]{}'\"]|\b(print|def|for|while|import)\b")
+
+# (label, pattern) checked in order on inputs without code snippets. Each
+# needs the verb and what it applies to, "I have a comment" is no request.
+KEYWORD_RULES = [
+    ("comment codes",
+     re.compile(r"\b(comment\w*|annotat\w*)\b.*\b(codes?|cells?|program|"
+                r"functions?|script)\b")),
+    ("explain all materials",
+     re.compile(r"\bexplain\b.*\b(left|highlighted|blue|section|lecture|"
+                r"materials?|cells?|notebook|everything|page)\b")),
+    ("debug all codes",
+     re.compile(r"\b(fix|debug|revise|correct)\b.*\b(codes?|cells?|section|"
+                r"program|notebook|everything)\b")),
+]
+
+# Seed examples so the classifier is usable before any input was logged
+SEED_SAMPLES = [
+    ("hi", "unknown"),
+    ("thank you", "unknown"),
+    ("next", "unknown"),
+    ("what is a variable", "unknown"),
+    ("can you explain what it means by a, b = b, a+1?", "simple explain"),
+    ("can you explain the codes?", "simple explain"),
+    ("explain this line print(x)", "simple explain"),
+    ("can you explain the codes on the left?", "explain all materials"),
+    ("can you explain the highlighted codes?", "explain all materials"),
+    ("explain this section to me", "explain all materials"),
+    ("can you comment the codes?", "comment codes"),
+    ("please add comments to my code", "comment codes"),
+    ("can you fix the codes?", "debug all codes"),
+    ("please debug my program", "debug all codes"),
+    ("can you fix this: print(\"hello world')", "simple debug"),
+    ("why does x = 1 +  give an error", "simple debug"),
+    ("I have a comment about today", "unknown"),
+    ("please correct me if I am wrong", "unknown"),
+    ("what is a bug", "unknown"),
+]
+
+
+def tokenize(text: str) -> list[str]:
+    words = re.findall(r"\w+", text.lower())
+    tokens = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+    if CODE_PATTERN.search(text):
+        tokens.append("__code__")
+    return tokens
+
+
+def norm(a: dict) -> float:
+    return math.sqrt(sum(v * v for v in a.values()))
+
+
+def cosine(a: dict, b: dict, b_norm: Optional[float] = None) -> float:
+    dot = sum(value * b.get(key, 0.0) for key, value in a.items())
+    denominator = norm(a) * (norm(b) if b_norm is None else b_norm)
+    return dot / denominator if denominator else 0.0
+
+
+class TaskClassifier:
+    """Cheap first stage in front of the LLM task detector.
+
+    Keyword rules answer the clear-cut inputs. The rest is scored against one
+    centroid of unigram/bigram counts per provideTaskDetection label, trained
+    from the seed examples and the inputs labelled by the LLM detector that
+    the rules do not answer, the only kind of input the centroids ever see.
+    """
+
+    def __init__(self, temperature: float = 0.15):
+        self.temperature = temperature
+        self.sums: dict[str, Counter] = defaultdict(Counter)
+        self.counts: Counter = Counter()
+        # label -> (centroid, its norm), kept up to date for predict
+        self.centroids: dict[str, tuple[dict, float]] = {}
+
+    def _update_centroid(self, label: str):
+        centroid = {
+            k: v / self.counts[label]
+            for k, v in self.sums[label].items()
+        }
+        self.centroids[label] = (centroid, norm(centroid))
+
+    def _add(self, text: str, label: str) -> bool:
+        if self.rule(text) is not None:
+            return False
+        self.sums[label].update(tokenize(text))
+        self.counts[label] += 1
+        return True
+
+    def add_sample(self, text: str, label: str):
+        if self._add(text, label):
+            self._update_centroid(label)
+
+    def fit(self, samples: list[tuple[str, str]]) -> "TaskClassifier":
+        for text, label in samples:
+            self._add(text, label)
+        for label in self.sums:
+            self._update_centroid(label)
+        return self
+
+    @staticmethod
+    def rule(text: str) -> Optional[str]:
+        """Label of the keyword rules, None when they do not decide."""
+        lowered = text.lower()
+        if not ROUTINE_WORDS.search(lowered):
+            return "unknown"
+        if not CODE_PATTERN.search(text):
+            for label, pattern in KEYWORD_RULES:
+                if pattern.search(lowered):
+                    return label
+        return None
+
+    def predict(self, text: str) -> tuple[str, float]:
+        """Return (label, confidence) with confidence in [0, 1]."""
+        label = self.rule(text)
+        if label is not None:
+            return label, 1.0
+
+        if not self.counts:
+            return "unknown", 0.0
+        vector = Counter(tokenize(text))
+        scores = {
+            label: cosine(vector, centroid, centroid_norm)
+            for label, (centroid, centroid_norm) in self.centroids.items()
+        }
+        # Softmax over the similarities
+        top = max(scores.values())
+        weights = {
+            label: math.exp((score - top) / self.temperature)
+            for label, score in scores.items()
+        }
+        label = max(weights, key=weights.get)
+        return label, weights[label] / sum(weights.values())
+
+
+def load_logged_samples(log: str = TASK_DETECTION_LOG) -> list[tuple[str, str]]:
+    path = get_db_path(log)
+    samples = []
+    # The rotated log first, it holds the older samples
+    for file in (f"{path}.1", path):
+        if not os.path.exists(file):
+            continue
+        with open(file, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                    samples.append((record["input"], record["task_type"]))
+                except (ValueError, KeyError):
+                    continue
+    return samples
+
+
+_log_lock = threading.Lock()
+
+
+def write_sample(text: str,
+                 label: str,
+                 log: str = TASK_DETECTION_LOG,
+                 max_bytes: int = TASK_DETECTION_LOG_SIZE):
+    path = get_db_path(log)
+    try:
+        with _log_lock:
+            if os.path.exists(path) and os.path.getsize(path) >= max_bytes:
+                os.replace(path, f"{path}.1")
+            with open(path, "a", encoding="utf-8") as f:
+                f.write(json.dumps({"input": text, "task_type": label}) + "\n")
+    except OSError as e:
+        logger.error(f"Error logging task detection sample: {e}")
+
+
+def log_sample(text: str, label: str, log: str = TASK_DETECTION_LOG):
+    """Record an LLM detection and learn from it right away, if enabled."""
+    if not TASK_DETECTION_LEARN:
+        return
+    task_classifier.add_sample(text, label)
+    write_sample(text, label, log)
+
+
+async def alog_sample(text: str, label: str, log: str = TASK_DETECTION_LOG):
+    if not TASK_DETECTION_LEARN:
+        return
+    task_classifier.add_sample(text, label)
+    await asyncio.to_thread(write_sample, text, label, log)
+
+
+def get_task_classifier(samples: Optional[list[tuple[str, str]]] = None):
+    if samples is None:
+        samples = load_logged_samples() if TASK_DETECTION_LEARN else []
+    return TaskClassifier().fit(SEED_SAMPLES + samples)
+
+
+task_classifier = get_task_classifier()
@@ -3,3 +3,8 @@ from typing import TypedDict, Literal
 
 class GraphConfig(TypedDict):
     mode: Literal["released", "dev"] = "dev"
+    # Judge the input concurrently with the teacher instead of before it
+    speculative: bool = False
+    # Judge the teacher output after it is complete, or window by window
+    # while it is generated so that judged-safe windows can be streamed
+    output_guard: Literal["full", "incremental"] = "full"
@@ -1,11 +1,12 @@
 import os
 import sqlite3
 
-# import aiosqlite
-# from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+import aiosqlite
 
-from typing import Any
+from typing import Any, Optional
+from langgraph.checkpoint.base import BaseCheckpointSaver
 from langgraph.checkpoint.sqlite import SqliteSaver
+from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
 
 
 from pyteach.utils import get_logger
@@ -23,15 +24,74 @@ def get_db_path(db):
     return db_path
 
 
+class LazyAsyncSqliteSaver(BaseCheckpointSaver):
+    """Checkpointer that can be created at import time.
+
+    AsyncSqliteSaver binds the running event loop in __init__, so it cannot be
+    built while `pyteach.agent` is imported. This one creates it on its first
+    call, i.e. inside the server's event loop, and delegates to it.
+    """
+
+    def __init__(self, db_path: str):
+        super().__init__()
+        self.db_path = db_path
+        self.saver: Optional[AsyncSqliteSaver] = None
+
+    def _get_saver(self) -> AsyncSqliteSaver:
+        # No await in between: concurrent first calls share one saver
+        if self.saver is None:
+            self.saver = AsyncSqliteSaver(aiosqlite.connect(self.db_path))
+        return self.saver
+
+    def get_tuple(self, config):
+        return self._get_saver().get_tuple(config)
+
+    def list(self, config, **kwargs):
+        return self._get_saver().list(config, **kwargs)
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        return self._get_saver().put(config, checkpoint, metadata,
+                                     new_versions)
+
+    def put_writes(self, config, writes, task_id, *args):
+        return self._get_saver().put_writes(config, writes, task_id, *args)
+
+    async def aget_tuple(self, config):
+        return await self._get_saver().aget_tuple(config)
+
+    async def alist(self, config, **kwargs):
+        async for item in self._get_saver().alist(config, **kwargs):
+            yield item
+
+    async def aput(self, config, checkpoint, metadata, new_versions):
+        return await self._get_saver().aput(config, checkpoint, metadata,
+                                            new_versions)
+
+    async def aput_writes(self, config, writes, task_id, *args):
+        return await self._get_saver().aput_writes(config, writes, task_id,
+                                                   *args)
+
+    def get_next_version(self, current, channel):
+        return self._get_saver().get_next_version(current, channel)
+
+    async def aclose(self):
+        """Stop the aiosqlite worker thread, otherwise the process hangs."""
+        if self.saver is not None:
+            await self.saver.conn.close()
+            self.saver = None
+
+
 def get_sql_checkpointer(db: str = "checkpoints.sqlite"):
     db_path = get_db_path(db)
     conn = sqlite3.connect(db_path, check_same_thread=False)
     memory_checkpointer = SqliteSaver(conn)
-    # conn = aiosqlite.connect(db_path)
-    # memory_checkpointer = AsyncSqliteSaver(conn)
     return memory_checkpointer
 
 
+def get_async_sql_checkpointer(db: str = "checkpoints.sqlite"):
+    return LazyAsyncSqliteSaver(get_db_path(db))
+
+
 def clean_memory_by_thread(thread_id: Any, db: str = "checkpoints.sqlite"):
     try:
         db_path = get_db_path(db)
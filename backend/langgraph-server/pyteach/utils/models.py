@@ -0,0 +1,326 @@
+import os
+import json
+import asyncio
+import hashlib
+
+import httpx
+from typing import Optional, Sequence, Type, Union, Callable
+from ollama import Client, AsyncClient
+from pydantic import BaseModel, ConfigDict
+from langchain_core.runnables import Runnable
+from langchain_core.tools import BaseTool
+from langchain_ollama import ChatOllama
+
+from pyteach.utils.logging import get_logger
+from pyteach.utils.memory import get_db_path
+from pyteach.utils.prompts import (pyteach_sys_prompt, ltm_sys_prompt,
+                                   explain_sys_prompt, comment_sys_prompt,
+                                   teach_sys_prompt, detect_sys_prompt,
+                                   debug_sys_prompt)
+
+OLLAMA_BASE = os.getenv("OLLAMA_BASE", "http://localhost:11434")
+OLLAMA_MAX_CONNECTIONS = int(os.getenv("OLLAMA_MAX_CONNECTIONS", "32"))
+# How long Ollama keeps a model resident after its last request, e.g. "30m";
+# a negative value keeps it loaded forever
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+# Digests of the agent variants created in Ollama, kept across restarts
+AGENT_DIGESTS = os.getenv("PYTEACH_AGENT_DIGESTS", "ollama_agents.json")
+
+logger = get_logger()
+
+# ======================================================================================
+# =================================== Agents ===========================================
+# ======================================================================================
+# Use this to create different agents (e.g. guard, main-llm)
+modelfile_template = """
+FROM {model}
+
+PARAMETER temperature {temperature}
+PARAMETER seed 118010142
+PARAMETER num_ctx {num_ctx}
+
+SYSTEM \"""{system_prompt}\"""
+"""
+
+
+class AgentSpec(BaseModel):
+    """Definition of an Ollama model variant used by the graph."""
+    model_config = ConfigDict(frozen=True)
+
+    name: str
+    system_prompt: str = ""
+    model: str = "qwen2.5"
+    temperature: float = 0
+    num_ctx: int = 10240
+    keep_alive: Union[int, str] = OLLAMA_KEEP_ALIVE
+
+    @property
+    def modelfile(self) -> str:
+        return modelfile_template.format(model=self.model,
+                                         temperature=self.temperature,
+                                         num_ctx=self.num_ctx,
+                                         system_prompt=self.system_prompt)
+
+    @property
+    def digest(self) -> str:
+        content = f"{self.name}\n{self.modelfile}".encode("utf-8")
+        return hashlib.sha256(content).hexdigest()
+
+
+class AgentRegistry:
+    """Create each agent variant in Ollama once instead of on every graph step.
+
+    Variants are keyed by the content hash of their definition, saved in
+    `digests_file` once created. `ensure` only talks to Ollama when a variant
+    was never created, was deleted from Ollama (checked once against its
+    model list) or when its definition changed since, so a restart creates
+    nothing and after `register_all` the init nodes are a dictionary lookup.
+    """
+
+    def __init__(self,
+                 ollama_base: str = OLLAMA_BASE,
+                 digests_file: str = AGENT_DIGESTS):
+        self.ollama_base = ollama_base
+        self.digests_file = digests_file
+        self.specs: dict[str, AgentSpec] = {}
+        # agent name -> digest in Ollama, None until loaded
+        self._created: Optional[dict[str, str]] = None
+        self._lock = asyncio.Lock()
+
+    def define(self, spec: AgentSpec):
+        self.specs[spec.name] = spec
+
+    def get_spec(self, name: str) -> Optional[AgentSpec]:
+        # Ollama model names are case-insensitive
+        for spec in self.specs.values():
+            if spec.name.lower() == name.lower():
+                return spec
+        return None
+
+    def is_registered(self, name: str) -> bool:
+        spec = self.specs[name]
+        return (self._created is not None
+                and self._created.get(name) == spec.digest)
+
+    def _read_digests(self) -> dict:
+        try:
+            with open(get_db_path(self.digests_file), encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _load(self, models: dict):
+        """Trust the saved digests of the variants Ollama still has."""
+        existing = {(model.get("name") or model["model"]).lower().removesuffix(
+            ":latest") for model in models["models"]}
+        saved = self._read_digests().get(self.ollama_base, {})
+        self._created = {
+            name: digest
+            for name, digest in saved.items() if name.lower() in existing
+        }
+
+    def _save(self):
+        digests = self._read_digests()
+        digests[self.ollama_base] = self._created
+        path = get_db_path(self.digests_file)
+        with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+            json.dump(digests, f, indent=2)
+        os.replace(f"{path}.tmp", path)
+
+    def ensure(self, name: str):
+        if self.is_registered(name):
+            return
+        client = Client(self.ollama_base)
+        if self._created is None:
+            self._load(client.list())
+            if self.is_registered(name):
+                return
+        spec = self.specs[name]
+        logger.debug(f"Creating agent {name}:\n {spec.modelfile}")
+        client.create(model=name, modelfile=spec.modelfile)
+        self._created[name] = spec.digest
+        self._save()
+
+    async def aensure(self, name: str):
+        if self.is_registered(name):
+            return
+        async with self._lock:
+            client = AsyncClient(self.ollama_base)
+            if self._created is None:
+                self._load(await client.list())
+            if self.is_registered(name):
+                return
+            spec = self.specs[name]
+            logger.debug(f"Creating agent {name}:\n {spec.modelfile}")
+            await client.create(model=name, modelfile=spec.modelfile)
+            self._created[name] = spec.digest
+            await asyncio.to_thread(self._save)
+
+    def register_all(self):
+        for name in self.specs:
+            self.ensure(name)
+
+    async def aregister_all(self):
+        for name in self.specs:
+            await self.aensure(name)
+
+    async def awarm_up(self) -> dict[str, bool]:
+        """Load every agent into Ollama memory with its keep_alive.
+
+        An empty prompt makes Ollama load the model without generating, so the
+        first student request does not pay the model-load latency.
+        """
+        client = AsyncClient(self.ollama_base)
+
+        async def warm_up(spec: AgentSpec) -> bool:
+            try:
+                await client.generate(model=spec.name,
+                                      prompt="",
+                                      keep_alive=spec.keep_alive)
+                return True
+            except Exception as e:
+                logger.error(f"Error warming up {spec.name}: {e}")
+                return False
+
+        # Ollama loads one model at a time, keep the order deterministic
+        warm = {}
+        for spec in self.specs.values():
+            warm[spec.name] = await warm_up(spec)
+        logger.info(f"Warm-up finished: {warm}")
+        return warm
+
+    async def ahot_models(self) -> dict[str, bool]:
+        """Report which agents are currently resident in Ollama memory.
+
+        Ollama serves variants that share base weights and num_ctx from one
+        loaded runner and lists it under whichever name loaded it first, so a
+        variant also counts as hot when one of its siblings is listed.
+        """
+        response = await AsyncClient(self.ollama_base).ps()
+        loaded = {
+            (model.get("name") or model["model"]).lower().removesuffix(
+                ":latest") for model in response["models"]
+        }
+        hot = {}
+        for spec in self.specs.values():
+            siblings = {spec.model.lower().removesuffix(":latest")}
+            siblings.update(
+                other.name.lower() for other in self.specs.values()
+                if (other.model, other.num_ctx) == (spec.model, spec.num_ctx))
+            hot[spec.name] = bool(siblings & loaded)
+        return hot
+
+
+agent_registry = AgentRegistry()
+for spec in [
+        AgentSpec(name="input_guard", model="llama-guard3:1b"),
+        AgentSpec(name="output_guard", model="llama-guard3:1b"),
+        AgentSpec(name="PyTeach", system_prompt=pyteach_sys_prompt),
+        AgentSpec(name="PyTeach-Detect", system_prompt=detect_sys_prompt),
+        AgentSpec(name="PyTeach-Explain", system_prompt=explain_sys_prompt),
+        AgentSpec(name="PyTeach-Comment", system_prompt=comment_sys_prompt),
+        AgentSpec(name="Pyteach-Debug", system_prompt=debug_sys_prompt),
+        AgentSpec(name="PyTeach-Teach",
+                  system_prompt=teach_sys_prompt,
+                  temperature=0.5),
+        AgentSpec(name="memory_updater", system_prompt=ltm_sys_prompt),
+]:
+    agent_registry.define(spec)
+
+
+def create_agent(agent_name,
+                 system_prompt,
+                 ollama_base=OLLAMA_BASE,
+                 num_ctx=10240,
+                 model="qwen2.5",
+                 temperature=0):
+    """Create a one-off agent, bypassing the registry."""
+    spec = AgentSpec(name=agent_name,
+                     system_prompt=system_prompt,
+                     model=model,
+                     temperature=temperature,
+                     num_ctx=num_ctx)
+    logger.debug(f"Creating agent {agent_name}:\n {spec.modelfile}")
+    client = Client(ollama_base)
+    client.create(model=agent_name, modelfile=spec.modelfile)
+
+
+# ======================================================================================
+# =================================== Clients ==========================================
+# ======================================================================================
+class ModelPool:
+    """Process-wide cache of ChatOllama clients.
+
+    A ChatOllama owns its own httpx clients, so building one per node call
+    pays object construction and a new TCP handshake every time. The pool
+    keeps one client per (agent_name, base_url) with keep-alive connection
+    pooling, plus the `bind_tools` / `with_structured_output` wrappers built
+    on top of it. All of them are stateless and safe to share between chats.
+    """
+
+    def __init__(self, max_connections: int = OLLAMA_MAX_CONNECTIONS):
+        self.client_kwargs = {
+            "limits":
+            httpx.Limits(max_connections=max_connections,
+                         max_keepalive_connections=max_connections)
+        }
+        self._models: dict[tuple, Runnable] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self,
+            agent_name: str,
+            base_url: str = OLLAMA_BASE,
+            tools: Optional[Sequence[Union[BaseTool, Callable]]] = None,
+            structured_output: Optional[Type[BaseModel]] = None,
+            keep_alive: Optional[Union[int, str]] = None) -> Runnable:
+        tool_names = tuple(
+            tool.name if isinstance(tool, BaseTool) else tool.__name__
+            for tool in tools or [])
+        key = (agent_name, base_url, tool_names, structured_output)
+        if key in self._models:
+            self.hits += 1
+            return self._models[key]
+        self.misses += 1
+
+        base_key = (agent_name, base_url, (), None)
+        llm = self._models.get(base_key)
+        if llm is None:
+            llm = ChatOllama(model=agent_name,
+                             base_url=base_url,
+                             keep_alive=keep_alive,
+                             client_kwargs=self.client_kwargs)
+            self._models[base_key] = llm
+        if tools:
+            llm = llm.bind_tools(tools)
+        if structured_output is not None:
+            llm = llm.with_structured_output(structured_output)
+        self._models[key] = llm
+        return llm
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "size": len(self._models),
+        }
+
+    def clear(self):
+        self._models.clear()
+        self.hits = 0
+        self.misses = 0
+
+
+model_pool = ModelPool()
+
+
+def get_model(agent_name: str,
+              base_url: str = OLLAMA_BASE,
+              tools: Optional[Sequence[Union[BaseTool, Callable]]] = None,
+              structured_output: Optional[Type[BaseModel]] = None):
+    spec = agent_registry.get_spec(agent_name)
+    keep_alive = spec.keep_alive if spec else OLLAMA_KEEP_ALIVE
+    return model_pool.get(agent_name, base_url, tools, structured_output,
+                          keep_alive)
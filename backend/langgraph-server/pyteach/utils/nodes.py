@@ -1,89 +1,83 @@
 import os
+import re
+import asyncio
 
 from typing import Literal
 
-from ollama import Client
-
-from langchain_ollama import ChatOllama
 from langchain_core.runnables import RunnableConfig
-from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
+from langchain_core.messages import (HumanMessage, AIMessage, SystemMessage,
+                                     message_chunk_to_message)
 from langgraph.errors import NodeInterrupt
+from langgraph.types import StreamWriter
+from langgraph.graph import add_messages
 
 from pyteach.utils import get_logger
-from pyteach.utils.prebuilt import ToolNode
-from pyteach.utils.tools import (tools, get_what_user_is_reading,
-                                 get_user_codes, write_codes_to_new_cell)
+from pyteach.utils.cache import LRUCache, text_key
+from pyteach.utils.classifier import task_classifier, alog_sample
+from pyteach.utils.models import agent_registry, get_model
+from pyteach.utils.notebook import notebook_context
+from pyteach.utils.prebuilt import ToolNode, ToolMetrics
+from pyteach.utils.tools import (tools, tool_policies,
+                                 get_what_user_is_reading, get_user_codes,
+                                 write_codes_to_new_cell)
 from pyteach.utils.structured_io import (provideTaskDetection,
                                          detectionToTaskType)
 from pyteach.utils.state import (InputGuardState, GlobalOutputState,
-                                 TeacherState, OutputGuardState)
-from pyteach.utils.prompts import (pyteach_sys_prompt,
-                                   get_guard_interruption_prompt,
+                                 TeacherState, OutputGuardState,
+                                 SpeculativeTeacherState)
+from pyteach.utils.prompts import (get_guard_interruption_prompt,
                                    filter_unsafe_judgement, get_ltm_prompt,
-                                   ltm_sys_prompt, explain_sys_prompt,
-                                   comment_sys_prompt, teach_sys_prompt, detect_sys_prompt, debug_sys_prompt)
-
-# TODO: Configurable through .env
-OLLAMA_BASE = os.getenv("OLLAMA_BASE", "http://localhost:11434")
+                                   get_notebook_context_prompt)
 
 # STM_INTERVAL = (1, 3)
 STM_INTERVAL = (4, 12)
 
-logger = get_logger()
-
-# ======================================================================================
-# =================================== Common ===========================================
-# ======================================================================================
-# Use this to create different agents (e.g. guard, main-llm)
-modelfile_template = """
-FROM {model}
+# The incremental output guard judges the teacher output in windows that end
+# at a sentence or paragraph boundary and hold at least this many characters
+GUARD_WINDOW_MIN_CHARS = 80
+GUARD_WINDOW_BOUNDARY = re.compile(r"(?<=[.!?])\s+|\n\s*\n")
 
-PARAMETER temperature {temperature}
-PARAMETER seed 118010142
-PARAMETER num_ctx {num_ctx}
+# The LLM task detector only runs below this local classifier confidence
+TASK_CLASSIFIER_THRESHOLD = float(
+    os.getenv("PYTEACH_TASK_CLASSIFIER_THRESHOLD", "0.8"))
 
-SYSTEM \"""{system_prompt}\"""
-"""
+# Give the teacher the student's active cell up front, as pushed by the
+# notebook, instead of waiting for it to call a tool for it
+NOTEBOOK_CONTEXT_PREFILL = os.getenv("PYTEACH_NOTEBOOK_CONTEXT_PREFILL",
+                                     "1") == "1"
 
+logger = get_logger()
 
-def create_agent(agent_name,
-                 system_prompt,
-                 ollama_base=OLLAMA_BASE,
-                 num_ctx=10240,
-                 model="qwen2.5"):
-    modelfile = modelfile_template.format(model=model,
-                                          temperature=0,
-                                          num_ctx=num_ctx,
-                                          system_prompt=system_prompt)
-    if agent_name == "PyTeach-Teach":
-        modelfile = modelfile_template.format(model=model,
-                                          temperature=0.5,
-                                          num_ctx=num_ctx,
-                                          system_prompt=system_prompt)
-    logger.debug(f"Creating agent {agent_name}:\n {modelfile}")
-    client = Client(ollama_base)
-    client.create(model=agent_name, modelfile=modelfile)
+# Verdicts of the guards, keyed on the guard definition and the normalized text
+guard_verdict_cache = LRUCache(
+    maxsize=int(os.getenv("PYTEACH_GUARD_CACHE_SIZE", "4096")),
+    ttl=float(os.getenv("PYTEACH_GUARD_CACHE_TTL", "3600")))
 
 
-def get_model(agent_name: str, base_url: str = OLLAMA_BASE):
-    return ChatOllama(model=agent_name, base_url=base_url)
+# ======================================================================================
+# =================================== Common ===========================================
+# ======================================================================================
+async def cached_guard_judgement(guard_name: str, message, parse_response):
+    """Judge `message` with the guard, reusing the verdict for identical text."""
+    key = text_key(agent_registry.specs[guard_name].digest, str(message.content))
+    update = guard_verdict_cache.get(key)
+    if update is None:
+        guard = get_model(guard_name)
+        response = await guard.ainvoke([message])
+        update = parse_response(response)
+        guard_verdict_cache.set(key, update)
+    return dict(update)
 
 
 # ======================================================================================
 # =================================== InputGuard =======================================
 # ======================================================================================
-def init_input_guard(state: InputGuardState,
-                     config: RunnableConfig) -> InputGuardState:
-    create_agent(agent_name="input_guard",
-                 system_prompt="",
-                 model="llama-guard3:1b")
-
-
-def input_guard_judgement(state: InputGuardState,
-                          config: RunnableConfig) -> InputGuardState:
-    guard = get_model("input_guard")
-    input_msg = [HumanMessage(state["user_input"])]
-    response = guard.invoke(input_msg)
+async def init_input_guard(state: InputGuardState,
+                           config: RunnableConfig) -> InputGuardState:
+    await agent_registry.aensure("input_guard")
+
+
+def parse_input_guard_response(response: AIMessage) -> InputGuardState:
     update = {}
     update["guard_judgement"] = response.content.split('\n')[0]
     if update["guard_judgement"] == "unsafe":
@@ -93,6 +87,14 @@ def input_guard_judgement(state: InputGuardState,
     else:
         logger.debug("Unkonw Guard Judgement!")
         raise Exception("Unkonw Guard Judgement!")
+    return update
+
+
+async def input_guard_judgement(state: InputGuardState,
+                                config: RunnableConfig) -> InputGuardState:
+    update = await cached_guard_judgement("input_guard",
+                                          HumanMessage(state["user_input"]),
+                                          parse_input_guard_response)
     logger.debug(f"Input guard judgement: {update['guard_judgement']}")
     return update
 
@@ -101,8 +103,8 @@ def input_guard_router(state: InputGuardState, config: RunnableConfig):
     return state["guard_judgement"]
 
 
-def input_interruption_handler(state: InputGuardState,
-                               config: RunnableConfig) -> InputGuardState:
+async def input_interruption_handler(state: InputGuardState,
+                                     config: RunnableConfig) -> InputGuardState:
     judgement_category = state["judgement_category"]
     interruption_prompt = get_guard_interruption_prompt(
         judgement_category, "input")
@@ -110,47 +112,48 @@ def input_interruption_handler(state: InputGuardState,
     raise NodeInterrupt(AIMessage(interruption_prompt))
 
 
-def input_guard_to_teacher(state: InputGuardState,
-                           config: RunnableConfig) -> TeacherState:
+async def input_guard_to_teacher(state: InputGuardState,
+                                 config: RunnableConfig) -> TeacherState:
     return
 
 
 # ======================================================================================
 # =================================== Teacher ==========================================
 # ======================================================================================
-def init_teacher(state: TeacherState, config: RunnableConfig) -> TeacherState:
+async def init_teacher(state: TeacherState,
+                       config: RunnableConfig) -> TeacherState:
     logger.debug(f"init_teach received: {state}")
     task_type = state.get("task_type")
 
     # Task detection
     if state.get("task_type") == "default_task" and state["user_input"]:
-        task_type = task_detection(state["user_input"])
+        task_type = await task_detection(state["user_input"])
 
     # Init pre-defined routines for specific tasks
     if task_type == "explain":
-        create_agent("PyTeach-Explain", explain_sys_prompt)
+        await agent_registry.aensure("PyTeach-Explain")
         user_input_msg = HumanMessage(
             "Please retrieve and explain the content in the jupyter notebook to me."
             )
     elif task_type == "comment":
-        create_agent("PyTeach-Comment", comment_sys_prompt)
+        await agent_registry.aensure("PyTeach-Comment")
         user_input_msg = HumanMessage(
                 "Please retrieve and comment the codes.")
     elif task_type == "debug":
         # TODO
-        create_agent("Pyteach-Debug", debug_sys_prompt)
+        await agent_registry.aensure("Pyteach-Debug")
         user_input_msg = HumanMessage(
             "Please retrieve and debug the codes.")
     elif task_type == "teach":
         # TODO
-        create_agent("PyTeach-Teach", teach_sys_prompt)
+        await agent_registry.aensure("PyTeach-Teach")
         user_input_msg = HumanMessage(state["user_input"])
     elif task_type == "default_task":
         user_input_msg = HumanMessage(state["user_input"])
     else:
         raise Exception("Unknown task_type!")
 
-    create_agent("PyTeach", pyteach_sys_prompt)
+    await agent_registry.aensure("PyTeach")
     # append the user input to the messages list
 
     ltm = state.get("ltm", "")
@@ -163,9 +166,9 @@ def init_teacher(state: TeacherState, config: RunnableConfig) -> TeacherState:
         logger.debug(
             f"stm contains {len(crt_stm_messages)} messages BEFORE memory maintenance."
         )
-        create_agent("memory_updater", ltm_sys_prompt)
+        await agent_registry.aensure("memory_updater")
         memory_updater = get_model("memory_updater")
-        response = memory_updater.invoke(
+        response = await memory_updater.ainvoke(
             [HumanMessage(get_ltm_prompt(ltm, crt_stm_messages))])
         ltm = response.content
 
@@ -188,15 +191,21 @@ def init_teacher(state: TeacherState, config: RunnableConfig) -> TeacherState:
 
 
 # Task detection
-def task_detection(
+async def task_detection(
     user_input: str
 ) -> Literal["default_task", "explain", "comment", "debug", "teach"]:
-    create_agent("PyTeach-Detect", detect_sys_prompt)
-    llm = get_model("PyTeach-Detect").with_structured_output(
-        provideTaskDetection)
-    response: provideTaskDetection = llm.invoke([HumanMessage(user_input)])
+    label, confidence = task_classifier.predict(user_input)
+    logger.debug(f"Local task classifier: {label} ({confidence:.2f})")
+    if confidence >= TASK_CLASSIFIER_THRESHOLD:
+        return detectionToTaskType.get(label, "default_task")
+
+    await agent_registry.aensure("PyTeach-Detect")
+    llm = get_model("PyTeach-Detect", structured_output=provideTaskDetection)
+    response: provideTaskDetection = await llm.ainvoke(
+        [HumanMessage(user_input)])
     logger.debug(f"Response of task_detection: {response}")
     if response:
+        await alog_sample(user_input, response.task_type)
         return detectionToTaskType.get(response.task_type, "default_task")
     return "default_task"
 
@@ -211,18 +220,19 @@ def teacher_tool_calling_router(state: TeacherState, config: RunnableConfig):
         return "tool_calling"
 
 
-def teacher(state: TeacherState, config: RunnableConfig) -> TeacherState:
+async def teacher(state: TeacherState, config: RunnableConfig,
+                  writer: StreamWriter) -> TeacherState:
     logger.debug(f"teacher received: {state}")
     if state["task_type"] == "explain":
-        llm = get_model(agent_name="Pyteach-Explain").bind_tools(
-            [get_what_user_is_reading])
+        llm = get_model(agent_name="Pyteach-Explain",
+                        tools=[get_what_user_is_reading])
     elif state["task_type"] == "comment":
-        llm = get_model(agent_name="Pyteach-Comment").bind_tools(
-            [get_user_codes, write_codes_to_new_cell])
+        llm = get_model(agent_name="Pyteach-Comment",
+                        tools=[get_user_codes, write_codes_to_new_cell])
     elif state["task_type"] == "debug":
         # TODO
-        llm = get_model(agent_name="Pyteach-Debug").bind_tools(
-            [get_user_codes, write_codes_to_new_cell])
+        llm = get_model(agent_name="Pyteach-Debug",
+                        tools=[get_user_codes, write_codes_to_new_cell])
     elif state["task_type"] == "teach":
         # TODO
         llm = get_model(agent_name="PyTeach-Teach")
@@ -230,7 +240,7 @@ def teacher(state: TeacherState, config: RunnableConfig) -> TeacherState:
     #     # TODO
     #     llm = get_model(agent_name="Pyteach").bind_tools(tools)
     elif state["task_type"] == "default_task":
-        llm = get_model(agent_name="Pyteach").bind_tools(tools)
+        llm = get_model(agent_name="Pyteach", tools=tools)
     else:
         raise Exception("Unknown task_type!")
 
@@ -244,12 +254,23 @@ def teacher(state: TeacherState, config: RunnableConfig) -> TeacherState:
     if ltm:
         input_msg.append(
             SystemMessage(f"The followings are your memory:\n{ltm}"))
+    if NOTEBOOK_CONTEXT_PREFILL and state["task_type"] != "teach":
+        snapshot = notebook_context.get(
+            config.get("configurable", {}).get("thread_id"))
+        if snapshot is not None and snapshot.content:
+            input_msg.append(
+                SystemMessage(
+                    get_notebook_context_prompt(snapshot.content,
+                                                snapshot.cell_type)))
     if crt_stm_messages:
         input_msg.extend(crt_stm_messages)
     logger.debug(f"Teacher's input_msg: {input_msg}")
 
     update = {}
-    response: AIMessage = llm.invoke(input_msg)
+    if config.get("configurable", {}).get("output_guard") == "incremental":
+        response = await guarded_generation(llm, input_msg, config, writer)
+    else:
+        response: AIMessage = await llm.ainvoke(input_msg)
     update["messages"] = [response]
     if not (hasattr(response, "tools_call") and response.tool_calls):
         update["output_message"] = response
@@ -257,22 +278,89 @@ def teacher(state: TeacherState, config: RunnableConfig) -> TeacherState:
     return update
 
 
-teacher_toolkit = ToolNode(tools, input_key="messages", output_key="messages")
+tool_metrics = ToolMetrics()
+teacher_toolkit = ToolNode(tools,
+                           input_key="messages",
+                           output_key="messages",
+                           policies=tool_policies,
+                           metrics_sink=tool_metrics)
+
+
+# ======================================================================================
+# ============================== Speculative Teacher ===================================
+# ======================================================================================
+def workflow_router(state: InputGuardState, config: RunnableConfig):
+    if config.get("configurable", {}).get("speculative", False):
+        return "speculative"
+    return "sequential"
+
+
+async def speculative_guard_and_teacher(state: SpeculativeTeacherState,
+                                        config: RunnableConfig,
+                                        writer: StreamWriter) -> TeacherState:
+    """Judge the input while the teacher is already working on it.
+
+    The input guard, the teacher init (task detection, memory maintenance) and
+    the first teacher generation run concurrently. For safe input the teacher
+    result is kept, which saves one guard round trip per turn; for unsafe
+    input the teacher task is cancelled before anything reaches the state.
+    """
+    # Output streamed by the teacher is held back until the input is judged
+    held_back = []
+
+    def speculative_writer(chunk):
+        if held_back is None:
+            writer(chunk)
+        else:
+            held_back.append(chunk)
+
+    async def speculate():
+        init_update = await init_teacher(state, config)
+        teacher_state = {
+            **state,
+            **init_update,
+            "messages": add_messages(state.get("messages", []),
+                                     init_update["messages"]),
+        }
+        teacher_update = await teacher(teacher_state, config,
+                                       speculative_writer)
+        return init_update, teacher_update
+
+    speculation = asyncio.create_task(speculate())
+    try:
+        await init_input_guard(state, config)
+        guard_update = await input_guard_judgement(state, config)
+        if guard_update["guard_judgement"] == "unsafe":
+            logger.debug("Speculation discarded: received unsafe input!")
+            await input_interruption_handler({
+                **state,
+                **guard_update
+            }, config)
+    except BaseException:
+        speculation.cancel()
+        raise
+
+    for chunk in held_back:
+        writer(chunk)
+    held_back = None
+    init_update, teacher_update = await speculation
+    return {
+        **init_update,
+        **teacher_update,
+        **guard_update,
+        "messages": init_update["messages"] + teacher_update["messages"],
+    }
 
 
 # ======================================================================================
 # =================================== Output Guard =====================================
 # ======================================================================================
-def init_output_guard(state: OutputGuardState,
-                      config: RunnableConfig) -> OutputGuardState:
-    create_agent("output_guard", "", model="llama-guard3:1b")
+async def init_output_guard(state: OutputGuardState,
+                            config: RunnableConfig) -> OutputGuardState:
+    await agent_registry.aensure("output_guard")
 
 
-def output_guard_judgement(state: OutputGuardState,
-                           config: RunnableConfig) -> OutputGuardState:
-    guard = get_model("output_guard")
-    input_msg = [state["output_message"]]
-    response = guard.invoke(input_msg)
+def parse_output_guard_response(response: AIMessage) -> OutputGuardState:
     update = {}
     update["guard_judgement"] = response.content.split('\n')[0]
     if update["guard_judgement"] == "unsafe":
@@ -285,16 +373,92 @@ def output_guard_judgement(state: OutputGuardState,
     elif update["guard_judgement"] != "unsafe":
         logger.debug("Unkonw Guard Judgement!")
         raise Exception("Unkonw Guard Judgement!")
+    return update
+
+
+async def output_guard_judgement(state: OutputGuardState,
+                                 config: RunnableConfig) -> OutputGuardState:
+    if config.get("configurable", {}).get("output_guard") == "incremental":
+        # Every window of the output was judged while it was generated
+        return {"guard_judgement": "safe", "judgement_category": ""}
+    update = await cached_guard_judgement("output_guard",
+                                          state["output_message"],
+                                          parse_output_guard_response)
     logger.debug(f"Output guard judgement: {update['guard_judgement']}")
     return update
 
 
+def split_guard_window(text: str) -> tuple[str, str]:
+    """Split text at its last window boundary into (window, rest)."""
+    cut = 0
+    for match in GUARD_WINDOW_BOUNDARY.finditer(text):
+        if match.end() >= GUARD_WINDOW_MIN_CHARS:
+            cut = match.end()
+    return text[:cut], text[cut:]
+
+
+async def guarded_generation(llm, input_msg, config: RunnableConfig,
+                             writer: StreamWriter) -> AIMessage:
+    """Generate with `llm` while the output guard judges the output.
+
+    The output is cut into sentence or paragraph windows as it is generated.
+    Each window is judged concurrently with the rest of the generation and
+    released to `writer`, in order, once it is judged safe. The first unsafe
+    window cancels the generation and interrupts the graph through
+    output_interruption_handler.
+    """
+    await agent_registry.aensure("output_guard")
+    windows = asyncio.Queue()
+
+    async def judge(window: str) -> OutputGuardState:
+        return await cached_guard_judgement("output_guard", AIMessage(window),
+                                            parse_output_guard_response)
+
+    def submit(window: str):
+        if window.strip():
+            windows.put_nowait((window, asyncio.create_task(judge(window))))
+
+    async def generate():
+        message = None
+        pending = ""
+        try:
+            async for chunk in llm.astream(input_msg):
+                message = chunk if message is None else message + chunk
+                if isinstance(chunk.content, str):
+                    pending += chunk.content
+                window, pending = split_guard_window(pending)
+                submit(window)
+            submit(pending)
+        finally:
+            windows.put_nowait(None)
+        return message
+
+    generation = asyncio.create_task(generate())
+    try:
+        while (item := await windows.get()) is not None:
+            window, judgement = item
+            update = await judgement
+            if update["guard_judgement"] == "unsafe":
+                await output_interruption_handler(update, config)
+            writer({"content": window})
+        message = await generation
+    except BaseException:
+        generation.cancel()
+        while not windows.empty():
+            if item := windows.get_nowait():
+                item[1].cancel()
+        raise
+    if message is None:
+        return AIMessage("")
+    return message_chunk_to_message(message)
+
+
 def output_guard_router(state: OutputGuardState, config: RunnableConfig):
     return state["guard_judgement"]
 
 
-def output_interruption_handler(state: OutputGuardState,
-                                config: RunnableConfig) -> OutputGuardState:
+async def output_interruption_handler(
+        state: OutputGuardState, config: RunnableConfig) -> OutputGuardState:
     judgement_category = state["judgement_category"]
     interruption_prompt = get_guard_interruption_prompt(
         judgement_category, "output")
@@ -302,6 +466,6 @@ def output_interruption_handler(state: OutputGuardState,
     raise NodeInterrupt(AIMessage(interruption_prompt))
 
 
-def output_guard_to_user(state: OutputGuardState,
-                         config: RunnableConfig) -> GlobalOutputState:
+async def output_guard_to_user(state: OutputGuardState,
+                               config: RunnableConfig) -> GlobalOutputState:
     return
@@ -0,0 +1,198 @@
+import os
+import time
+import uuid
+import asyncio
+import threading
+
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import Optional
+
+import socketio
+from pydantic import BaseModel
+
+from pyteach.utils.cache import LRUCache
+from pyteach.utils.logging import get_logger
+
+logger = get_logger()
+
+SOCKET_SERVER_URL = os.getenv("PYTEACH_SOCKET_SERVER", "http://localhost:3001")
+NOTEBOOK_TIMEOUT = float(os.getenv("PYTEACH_NOTEBOOK_TIMEOUT", "10"))
+# Pages (and chat threads) whose active cell is remembered
+NOTEBOOK_CONTEXT_SIZE = int(os.getenv("PYTEACH_NOTEBOOK_CONTEXT_SIZE", "4096"))
+
+
+class NotebookContext(BaseModel):
+    """What a student currently has selected in the notebook."""
+    client_id: str
+    content: str
+    cell_type: str
+    updated_at: float
+
+    @property
+    def jupyterlite_info(self) -> dict:
+        # Same shape as the reply to getActiveCellContent
+        return {
+            "ActiveCellContent": self.content,
+            "ActiveCellType": self.cell_type
+        }
+
+
+class NotebookContextCache:
+    """Latest active-cell snapshot of every page, pushed by the notebook.
+
+    The JupyterLite extension reports every active-cell change, so tools can
+    read the student's cell locally instead of asking the browser. Snapshots
+    are keyed by the socket id of the page (`client_id`, stamped by the
+    socket server), since every student on a lecture shares its source_id. A
+    chat thread is bound to the page it is opened in (`client_id` in the
+    chat config); unbound threads get no snapshot. Both maps are bounded.
+    """
+
+    def __init__(self, maxsize: int = NOTEBOOK_CONTEXT_SIZE):
+        self._by_client = LRUCache(maxsize=maxsize)
+        self._thread_client = LRUCache(maxsize=maxsize)
+        self._lock = threading.Lock()
+
+    def update(self, client_id: str, content: str, cell_type: str):
+        with self._lock:
+            self._by_client.set(
+                client_id,
+                NotebookContext(client_id=client_id,
+                                content=content,
+                                cell_type=cell_type,
+                                updated_at=time.time()))
+
+    def update_from_event(self, data: dict):
+        info = data.get("jupyterlite_info", {})
+        if "ActiveCellContent" not in info or not data.get("client_id"):
+            return
+        self.update(data["client_id"], info["ActiveCellContent"],
+                    info.get("ActiveCellType", "code"))
+
+    def bind(self, thread_id: str, client_id: str):
+        with self._lock:
+            self._thread_client.set(thread_id, client_id)
+
+    def client(self, thread_id: Optional[str] = None) -> Optional[str]:
+        """Socket id of the page the thread is bound to, if any."""
+        with self._lock:
+            return self._thread_client.get(thread_id)
+
+    def get(self, thread_id: Optional[str] = None) -> Optional[NotebookContext]:
+        with self._lock:
+            client_id = self._thread_client.get(thread_id)
+            return self._by_client.get(client_id) if client_id else None
+
+    def clear(self):
+        with self._lock:
+            self._by_client.clear()
+            self._thread_client.clear()
+
+
+notebook_context = NotebookContextCache()
+
+
+class NotebookChannel:
+    """One long-lived socket.io connection to the notebook, shared by all chats.
+
+    Every request registers its own AS room on the shared connection and is
+    correlated with its reply by that room id (the host echoes it back as
+    `target_id`), so many requests can be in flight at once and concurrent
+    students never receive each other's replies. The connection is opened at
+    startup and reconnects on its own, so tool calls only pay the round trip
+    to the browser. It also subscribes to the active-cell changes pushed by
+    the notebook and keeps them in `notebook_context`.
+    """
+
+    def __init__(self,
+                 url: str = SOCKET_SERVER_URL,
+                 timeout: float = NOTEBOOK_TIMEOUT):
+        self.url = url
+        self.timeout = timeout
+        self.sio = socketio.Client(reconnection=True)
+        self.sio.on("from_socket_to_AS", self._on_reply)
+        self.sio.on("notebook_context", notebook_context.update_from_event)
+        # Also runs on every reconnect, the server forgets subscriptions
+        self.sio.on("connect", self._subscribe)
+        self._pending: dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def connected(self) -> bool:
+        return self.sio.connected
+
+    def connect(self):
+        with self._lock:
+            if not self.sio.connected:
+                self.sio.connect(self.url, wait_timeout=self.timeout)
+                logger.info(f"Notebook channel connected to {self.url}")
+
+    def disconnect(self):
+        with self._lock:
+            if self.sio.connected:
+                self.sio.disconnect()
+        for future in list(self._pending.values()):
+            future.cancel()
+
+    def _subscribe(self):
+        self.sio.emit("subscribe_notebook_context")
+
+    def _on_reply(self, data: dict):
+        future = self._pending.pop(data.get("target_id"), None)
+        if future is None:
+            logger.warning(f"Dropping notebook reply for unknown request: "
+                           f"{data.get('target_id')}")
+            return
+        notebook_context.update_from_event(data)
+        # The request may have timed out or been cancelled in the meantime
+        if not future.done():
+            future.set_result(data)
+
+    def submit(self, task: str, **payload) -> tuple[str, Future]:
+        """Send a task to the notebook, return (request id, reply future)."""
+        self.connect()
+        as_info = dict(source_id=task + str(uuid.uuid4()), source_type="AS")
+        request_id = as_info["source_type"] + as_info["source_id"]
+        future = Future()
+        self._pending[request_id] = future
+
+        # The server leaves the room after replying, so each request has its
+        # own. Events on one connection are ordered: the join comes first.
+        self.sio.emit("register", as_info)
+        self.sio.emit("from_AS_to_socket", {**as_info, "task": task, **payload})
+        return request_id, future
+
+    def request(self,
+                task: str,
+                timeout: Optional[float] = None,
+                **payload) -> dict:
+        request_id, future = self.submit(task, **payload)
+        timeout = self.timeout if timeout is None else timeout
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeoutError:
+            raise TimeoutError(
+                f"Notebook did not answer {task} within {timeout}s")
+        finally:
+            self._pending.pop(request_id, None)
+
+    async def arequest(self,
+                       task: str,
+                       timeout: Optional[float] = None,
+                       **payload) -> dict:
+        if not self.connected:
+            await asyncio.to_thread(self.connect)
+        request_id, future = self.submit(task, **payload)
+        timeout = self.timeout if timeout is None else timeout
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future),
+                                          timeout)
+        except asyncio.TimeoutError:
+            raise TimeoutError(
+                f"Notebook did not answer {task} within {timeout}s")
+        finally:
+            self._pending.pop(request_id, None)
+
+
+notebook_channel = NotebookChannel()
@@ -1,6 +1,11 @@
 import asyncio
+import json
 import random
+import threading
 import time
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
 from copy import copy
 from typing import (
     Any,
@@ -20,6 +25,7 @@ from typing import (
 from langchain_core.messages import (
     AIMessage,
     AnyMessage,
+    HumanMessage,
     ToolCall,
     ToolMessage,
     BaseMessage,
@@ -45,12 +51,76 @@ from langgraph.prebuilt.tool_node import _get_state_args, _get_store_arg, msg_co
 
 from langchain_core.outputs import ChatGenerationChunk
 from langchain_core.language_models.chat_models import SimpleChatModel
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
+
+from pyteach.utils.logging import get_logger
+
+logger = get_logger()
 
 INVALID_TOOL_NAME_ERROR_TEMPLATE = (
     "Error: {requested_tool} is not a valid tool, try one of [{available_tools}]."
 )
 TOOL_CALL_ERROR_TEMPLATE = "Error: {error}\n Please fix your mistakes."
+TOOL_TIMEOUT_ERROR_TEMPLATE = (
+    "Error: {name} did not finish within {timeout}s. Try again later or "
+    "answer without it.")
+
+
+class ToolPolicy(BaseModel):
+    """How ToolNode runs one tool."""
+    model_config = ConfigDict(frozen=True)
+
+    timeout: Optional[float] = None
+    """Seconds per attempt, a timed-out call becomes an error ToolMessage."""
+    max_concurrency: Optional[int] = None
+    """Calls of this tool running at once, across all chats."""
+    retries: int = 0
+    """Extra attempts after a failure, only for idempotent tools."""
+    backoff: float = 0.5
+    """Delay before the first retry, doubled for every further one."""
+    read_only: bool = False
+    """Results are reused for identical calls later in the same turn."""
+
+    def retry_delay(self, attempt: int) -> float:
+        delay = self.backoff * 2**(attempt - 1)
+        return delay + random.uniform(0, delay / 2)
+
+
+class ToolCallMetric(BaseModel):
+    name: str
+    outcome: Literal["success", "error", "timeout", "cached"]
+    duration: float
+    attempts: int
+    payload_size: int
+
+
+class ToolMetrics:
+    """Metrics sink for ToolNode keeping the most recent calls of each tool."""
+
+    def __init__(self, window: int = 1000):
+        self.calls: Dict[str, deque] = defaultdict(
+            lambda: deque(maxlen=window))
+
+    def __call__(self, metric: ToolCallMetric):
+        logger.debug(f"Tool call: {metric}")
+        self.calls[metric.name].append(metric)
+
+    def stats(self) -> dict:
+        stats = {}
+        for name, calls in self.calls.items():
+            durations = sorted(call.duration for call in calls)
+            outcomes = defaultdict(int)
+            for call in calls:
+                outcomes[call.outcome] += 1
+            stats[name] = {
+                "count": len(calls),
+                "outcomes": dict(outcomes),
+                "p50_ms": durations[len(durations) // 2] * 1000,
+                "p95_ms": durations[int(len(durations) * 0.95)] * 1000,
+                "mean_payload_size":
+                sum(call.payload_size for call in calls) / len(calls),
+            }
+        return stats
 
 
 class ToolNode(RunnableCallable):
@@ -73,6 +143,12 @@ class ToolNode(RunnableCallable):
         return {self.output_key: result}
     ```
 
+    Each tool runs under its `ToolPolicy` (timeout, concurrency limit, retries),
+    and every call is reported to `metrics_sink` as a `ToolCallMetric`.
+    Identical calls in one message run once, and results of read-only tools
+    are reused for the rest of the turn (since the last HumanMessage) until a
+    write tool runs.
+
     Important:
         - The state MUST contain a list of messages.
         - The last message MUST be an `AIMessage`.
@@ -89,7 +165,10 @@ class ToolNode(RunnableCallable):
         tags: Optional[list[str]] = None,
         handle_tool_errors: Optional[bool] = True,
         input_key="messages",
-        output_key="messages"
+        output_key="messages",
+        policies: Optional[Dict[str, ToolPolicy]] = None,
+        default_policy: ToolPolicy = ToolPolicy(),
+        metrics_sink: Optional[Callable[[ToolCallMetric], None]] = None,
     ) -> None:
         super().__init__(self._func,
                          self._afunc,
@@ -109,6 +188,22 @@ class ToolNode(RunnableCallable):
             self.tools_by_name[tool_.name] = tool_
             self.tool_to_state_args[tool_.name] = _get_state_args(tool_)
             self.tool_to_store_arg[tool_.name] = _get_store_arg(tool_)
+        self.policies = {
+            name: (policies or {}).get(name, default_policy)
+            for name in self.tools_by_name
+        }
+        self.metrics_sink = metrics_sink
+        self._async_limits = {
+            name: asyncio.Semaphore(policy.max_concurrency)
+            for name, policy in self.policies.items() if policy.max_concurrency
+        }
+        self._sync_limits = {
+            name: threading.BoundedSemaphore(policy.max_concurrency)
+            for name, policy in self.policies.items() if policy.max_concurrency
+        }
+        # Sync calls with a timeout are waited for from here
+        self._timeout_executor = ThreadPoolExecutor(
+            thread_name_prefix="ToolNode")
 
     def _func(
         self,
@@ -122,9 +217,11 @@ class ToolNode(RunnableCallable):
         store: BaseStore,
     ) -> Any:
         tool_calls, output_type = self._parse_input(input, store)
-        config_list = get_config_list(config, len(tool_calls))
+        to_run, cached = self._plan_calls(input, tool_calls)
+        config_list = get_config_list(config, len(to_run))
         with get_executor_for_config(config) as executor:
-            outputs = [*executor.map(self._run_one, tool_calls, config_list)]
+            outputs = [*executor.map(self._run_one, to_run, config_list)]
+        outputs = self._fill_calls(tool_calls, to_run, outputs, cached)
         # TypedDict, pydantic, dataclass, etc. should all be able to load from dict
         return outputs if output_type == "list" else {self.output_key: outputs}
 
@@ -156,48 +253,244 @@ class ToolNode(RunnableCallable):
         store: BaseStore,
     ) -> Any:
         tool_calls, output_type = self._parse_input(input, store)
+        to_run, cached = self._plan_calls(input, tool_calls)
         outputs = await asyncio.gather(*(self._arun_one(call, config)
-                                         for call in tool_calls))
+                                         for call in to_run))
+        outputs = self._fill_calls(tool_calls, to_run, outputs, cached)
         # TypedDict, pydantic, dataclass, etc. should all be able to load from dict
         return outputs if output_type == "list" else {self.output_key: outputs}
 
+    @staticmethod
+    def _call_key(call: ToolCall) -> str:
+        return call["name"] + json.dumps(
+            call["args"], sort_keys=True, default=str)
+
+    def _is_read_only(self, call: ToolCall) -> bool:
+        policy = self.policies.get(call["name"])
+        return policy is not None and policy.read_only
+
+    def _turn_memo(self, messages: Sequence[AnyMessage]) -> Dict[str, str]:
+        """Results of read-only calls earlier in the turn, by call key."""
+        start = 0
+        for i, message in enumerate(messages):
+            if isinstance(message, HumanMessage):
+                start = i + 1
+        turn = messages[start:-1]
+        results = {
+            message.tool_call_id: message
+            for message in turn if isinstance(message, ToolMessage)
+        }
+        memo = {}
+        for message in turn:
+            if not isinstance(message, AIMessage):
+                continue
+            for call in message.tool_calls:
+                if not self._is_read_only(call):
+                    # A write may have changed what the reads returned
+                    memo.clear()
+                    continue
+                result = results.get(call["id"])
+                if result is not None and result.status != "error":
+                    memo[self._call_key(call)] = result.content
+        return memo
+
+    def _plan_calls(
+        self,
+        input: Union[list[AnyMessage], dict[str, Any], BaseModel],
+        tool_calls: List[ToolCall],
+    ) -> Tuple[List[ToolCall], Dict[str, str]]:
+        """Return the calls to run, one per distinct key, and the memoized
+        results of the turn that can be reused instead."""
+        if any(not self._is_read_only(call) for call in tool_calls):
+            memo = {}
+        else:
+            memo = self._turn_memo(self._get_messages(input))
+        to_run, keys = [], set()
+        for call in tool_calls:
+            key = self._call_key(call)
+            if key not in memo and key not in keys:
+                to_run.append(call)
+                keys.add(key)
+        return to_run, memo
+
+    def _fill_calls(self, tool_calls: List[ToolCall], to_run: List[ToolCall],
+                    outputs: List[ToolMessage],
+                    cached: Dict[str, str]) -> List[ToolMessage]:
+        """One ToolMessage per tool call, copying memoized and collapsed
+        results under the id of each call."""
+        results = {
+            self._call_key(call): output
+            for call, output in zip(to_run, outputs)
+        }
+        filled = []
+        for call in tool_calls:
+            key = self._call_key(call)
+            result = results.get(key)
+            if result is not None and result.tool_call_id == call["id"]:
+                filled.append(result)
+                continue
+            if result is not None:
+                content, status = result.content, result.status
+            else:
+                content, status = cached[key], "success"
+            filled.append(
+                ToolMessage(content,
+                            name=call["name"],
+                            tool_call_id=call["id"],
+                            status=status))
+            self._record(call, "cached", time.perf_counter(), 0, filled[-1])
+        return filled
+
+    def _get_messages(
+        self,
+        input: Union[list[AnyMessage], dict[str, Any], BaseModel],
+    ) -> Sequence[AnyMessage]:
+        if isinstance(input, list):
+            return input
+        if isinstance(input, dict):
+            return input.get(self.input_key, [])
+        return getattr(input, self.input_key, [])
+
     def _run_one(self, call: ToolCall, config: RunnableConfig) -> ToolMessage:
         if invalid_tool_message := self._validate_tool_call(call):
             return invalid_tool_message
 
-        try:
-            input = {**call, **{"type": "tool_call"}}
-            tool_message: ToolMessage = self.tools_by_name[
-                call["name"]].invoke(input, config)
-            tool_message.content = cast(
-                Union[str, list], msg_content_output(tool_message.content))
-            return tool_message
-        except Exception as e:
-            if not self.handle_tool_errors:
-                raise e
-            content = TOOL_CALL_ERROR_TEMPLATE.format(error=repr(e))
-            return ToolMessage(content,
-                               name=call["name"],
-                               tool_call_id=call["id"])
+        policy = self.policies[call["name"]]
+        start = time.perf_counter()
+        attempts = 0
+        while True:
+            attempts += 1
+            try:
+                tool_message = self._invoke_tool(call, config, policy)
+                outcome = "success"
+                break
+            except Exception as e:
+                if attempts <= policy.retries:
+                    time.sleep(policy.retry_delay(attempts))
+                    continue
+                outcome = "timeout" if isinstance(e, TimeoutError) else "error"
+                tool_message = self._error_message(call, e, policy, outcome,
+                                                   start, attempts)
+                break
+        self._record(call, outcome, start, attempts, tool_message)
+        return tool_message
 
     async def _arun_one(self, call: ToolCall,
                         config: RunnableConfig) -> ToolMessage:
         if invalid_tool_message := self._validate_tool_call(call):
             return invalid_tool_message
+
+        policy = self.policies[call["name"]]
+        start = time.perf_counter()
+        attempts = 0
+        async with self._async_limit(call["name"]):
+            while True:
+                attempts += 1
+                try:
+                    tool_message = await asyncio.wait_for(
+                        self._ainvoke_tool(call, config), policy.timeout)
+                    outcome = "success"
+                    break
+                except Exception as e:
+                    if attempts <= policy.retries:
+                        await asyncio.sleep(policy.retry_delay(attempts))
+                        continue
+                    outcome = "timeout" if isinstance(
+                        e, TimeoutError) else "error"
+                    tool_message = self._error_message(
+                        call, e, policy, outcome, start, attempts)
+                    break
+        self._record(call, outcome, start, attempts, tool_message)
+        return tool_message
+
+    def _invoke_tool(self, call: ToolCall, config: RunnableConfig,
+                     policy: ToolPolicy) -> ToolMessage:
+        limit = self._sync_limits.get(call["name"])
+        if limit is not None:
+            limit.acquire()
+        if policy.timeout is None:
+            try:
+                return self._call_tool(call, config)
+            finally:
+                if limit is not None:
+                    limit.release()
+        # The thread of a timed-out call cannot be stopped, but the caller
+        # no longer waits for it. It keeps its concurrency slot until it
+        # actually finishes.
+        try:
+            future = self._timeout_executor.submit(self._call_tool, call,
+                                                   config)
+        except BaseException:
+            if limit is not None:
+                limit.release()
+            raise
+        if limit is not None:
+            future.add_done_callback(lambda _: limit.release())
+        return future.result(timeout=policy.timeout)
+
+    def close(self):
+        """Stop the threads of sync calls, without waiting for running ones."""
+        self._timeout_executor.shutdown(wait=False, cancel_futures=True)
+
+    def _call_tool(self, call: ToolCall,
+                   config: RunnableConfig) -> ToolMessage:
+        input = {**call, **{"type": "tool_call"}}
+        tool_message: ToolMessage = self.tools_by_name[call["name"]].invoke(
+            input, config)
+        tool_message.content = cast(Union[str, list],
+                                    msg_content_output(tool_message.content))
+        return tool_message
+
+    async def _ainvoke_tool(self, call: ToolCall,
+                            config: RunnableConfig) -> ToolMessage:
+        input = {**call, **{"type": "tool_call"}}
+        tool_message: ToolMessage = await self.tools_by_name[
+            call["name"]].ainvoke(input, config)
+        tool_message.content = cast(Union[str, list],
+                                    msg_content_output(tool_message.content))
+        return tool_message
+
+    def _error_message(self, call: ToolCall, error: Exception,
+                       policy: ToolPolicy, outcome: str, start: float,
+                       attempts: int) -> ToolMessage:
+        if outcome == "timeout":
+            # Always recoverable, the LLM can answer without the tool
+            content = (TOOL_TIMEOUT_ERROR_TEMPLATE.format(
+                name=call["name"], timeout=policy.timeout)
+                       if policy.timeout is not None else
+                       TOOL_CALL_ERROR_TEMPLATE.format(error=repr(error)))
+        elif not self.handle_tool_errors:
+            self._record(call, outcome, start, attempts, None)
+            raise error
+        else:
+            content = TOOL_CALL_ERROR_TEMPLATE.format(error=repr(error))
+        return ToolMessage(content,
+                           name=call["name"],
+                           tool_call_id=call["id"],
+                           status="error")
+
+    @asynccontextmanager
+    async def _async_limit(self, name: str):
+        if name not in self._async_limits:
+            yield
+            return
+        async with self._async_limits[name]:
+            yield
+
+    def _record(self, call: ToolCall, outcome: str, start: float,
+                attempts: int, tool_message: Optional[ToolMessage]):
+        if self.metrics_sink is None:
+            return
+        payload_size = len(str(tool_message.content)) if tool_message else 0
         try:
-            input = {**call, **{"type": "tool_call"}}
-            tool_message: ToolMessage = await self.tools_by_name[
-                call["name"]].ainvoke(input, config)
-            tool_message.content = cast(
-                Union[str, list], msg_content_output(tool_message.content))
-            return tool_message
+            self.metrics_sink(
+                ToolCallMetric(name=call["name"],
+                               outcome=outcome,
+                               duration=time.perf_counter() - start,
+                               attempts=attempts,
+                               payload_size=payload_size))
         except Exception as e:
-            if not self.handle_tool_errors:
-                raise e
-            content = TOOL_CALL_ERROR_TEMPLATE.format(error=repr(e))
-            return ToolMessage(content,
-                               name=call["name"],
-                               tool_call_id=call["id"])
+            logger.error(f"Error recording tool metrics: {e}")
 
     def _parse_input(
         self,
@@ -99,6 +99,13 @@ You are a debugging assistant designed to help users identify and fix errors in
 4. Use the "write_codes_to_new_cell" tool to write the corrected code back to a new notebook cell for the user. Remember, the goal is to help the user understand and fix their code errors.
 """  # noqa
 
+
+def get_notebook_context_prompt(cell_content: str, cell_type: str) -> str:
+    if cell_type == "code":
+        return f"The user is currently viewing the following codes in the notebook:\n{cell_content}"  # noqa
+    return f"The user is currently reading the following lecture materials in the notebook:\n{cell_content}"  # noqa
+
+
 # ======================================================================================
 # =============================== Memory Management ====================================
 # ======================================================================================
@@ -1,57 +1,31 @@
-import re
-from .search import search_relevant_text
-RAG_template = '''Please refer to the following materials to answer the user's question:
-#materials#\n'''
-# 文本清洗函数
-
-
-def clean_text(text):
-    text = re.sub(r'[^\w\s]', '', text)
-    text = text.lower()
-    return text
-
-# N-gram 提取函数
-
+import os
 
-def get_ngrams(text, N=2):
-    tokens = text.split()
-    ngrams = set(zip(*[tokens[i:] for i in range(N)]))
-    return ngrams
+from .ngrams import clean_text
+from .search import retrieval_service
 
-# 改进的 Jaccard 系数
+# Documents each ranking (vector, BM25, bigram overlap) contributes to the
+# fusion. The lexical rankings are precomputed in the index, so a wide pool
+# costs little.
+RAG_CANDIDATES = int(os.getenv("PYTEACH_RAG_CANDIDATES", "32"))
 
-
-def improved_jaccard(query_ngrams, doc_ngrams):
-    intersection = query_ngrams.intersection(doc_ngrams)
-    min_size = min(len(query_ngrams), len(doc_ngrams))
-    if min_size == 0:
-        return 0
-    return len(intersection) / min_size
+RAG_template = '''Please refer to the following materials to answer the user's question:
+#materials#\n'''
 
 
 # 检索和重排序函数
 def retrieve_and_rerank(query, top_k=2):
     cleaned_query = clean_text(query)
-    query_ngrams = get_ngrams(cleaned_query, N=2)
-    # 初步检索，扩大检索范围以便后续过滤
-    indices = search_relevant_text(question=cleaned_query, k=top_k*2).output
-    candidates = []
-    for idx in indices:
-        doc = idx.fields['raw']
-        cleaned_doc = clean_text(doc)  # 对文档进行文本清洗
-        doc_ngrams = get_ngrams(cleaned_doc, N=2)  # 提取文档的 N-grams
+    # 向量检索与 BM25 检索, 用 RRF 融合排序
+    hits = retrieval_service.retrieve(cleaned_query, top_k,
+                                      max(top_k * 2, RAG_CANDIDATES))
+    return [hit.text for hit in hits]
 
-        # 计算改进的 Jaccard 系数
-        jaccard_score = improved_jaccard(query_ngrams, doc_ngrams)
-        if jaccard_score > 0:
-            candidates.append((jaccard_score, doc))
 
-    # 根据 Jaccard 系数进行重排序
-    candidates.sort(key=lambda x: x[0], reverse=True)
-
-    # 选取前 top_k 个文档
-    reranked_docs = [doc for score, doc in candidates[:top_k]]
-    return reranked_docs
+async def aretrieve_and_rerank(query, top_k=2):
+    cleaned_query = clean_text(query)
+    hits = await retrieval_service.aretrieve(cleaned_query, top_k,
+                                             max(top_k * 2, RAG_CANDIDATES))
+    return [hit.text for hit in hits]
 
 
 # 定义自定义检索器
@@ -71,11 +45,19 @@ class CustomRetriever:
         return docs
 
 
-def rag_function(query):
-    retriever = CustomRetriever(retrieve_and_rerank)
-    user_query = query
-    relevant_docs = retriever.get_relevant_documents(user_query)
+def organize(query, relevant_docs):
     organized_docs = "\n".join(
         [f"{i+1}. {doc}" for i, doc in enumerate(relevant_docs)])
     print(RAG_template+organized_docs+'\n'+'#user_query#'+'\n'+query)
     return RAG_template+organized_docs+'\n'+'#user_query#'+'\n'+query
+
+
+def rag_function(query):
+    retriever = CustomRetriever(retrieve_and_rerank)
+    user_query = query
+    relevant_docs = retriever.get_relevant_documents(user_query)
+    return organize(query, relevant_docs)
+
+
+async def arag_function(query):
+    return organize(query, await aretrieve_and_rerank(query))
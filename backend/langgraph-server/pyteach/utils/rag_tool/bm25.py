@@ -0,0 +1,99 @@
+import os
+
+from typing import Optional, Sequence
+
+import numpy as np
+
+from .ngrams import hash_tokens
+
+BM25_FILES = ("terms", "offsets", "docs", "tfs", "lengths")
+
+
+class BM25Index:
+    """In-process inverted index with Okapi BM25 scoring.
+
+    Terms are the 64-bit hashes of the cleaned words, sorted, with the
+    postings (document row and term frequency) of term i at
+    `offsets[i]:offsets[i + 1]`. A query looks its terms up with one
+    `searchsorted` and scores only the documents in their postings.
+    """
+
+    def __init__(self,
+                 terms: np.ndarray,
+                 offsets: np.ndarray,
+                 docs: np.ndarray,
+                 tfs: np.ndarray,
+                 lengths: np.ndarray,
+                 k1: float = 1.2,
+                 b: float = 0.75):
+        self.terms = terms
+        self.offsets = offsets
+        self.docs = docs
+        self.tfs = tfs
+        self.lengths = lengths
+        self.k1 = k1
+        self.b = b
+        n_docs = len(lengths)
+        df = np.diff(offsets)
+        self.idf = np.log1p((n_docs - df + 0.5) / (df + 0.5))
+        average = lengths.mean() if n_docs else 0.0
+        # Per-document part of the BM25 denominator
+        self.norms = k1 * (1 - b + b * lengths / max(average, 1e-12))
+
+    @classmethod
+    def build(cls, texts: Sequence[str], **kwargs) -> "BM25Index":
+        terms, docs, tfs = [], [], []
+        lengths = np.zeros(len(texts), dtype=np.float32)
+        for row, text in enumerate(texts):
+            tokens = hash_tokens(text)
+            lengths[row] = len(tokens)
+            unique, counts = np.unique(tokens, return_counts=True)
+            terms.append(unique)
+            docs.append(np.full(len(unique), row, dtype=np.int32))
+            tfs.append(counts.astype(np.float32))
+        terms = np.concatenate(terms) if terms else np.zeros(0, np.uint64)
+        docs = np.concatenate(docs) if docs else np.zeros(0, np.int32)
+        tfs = np.concatenate(tfs) if tfs else np.zeros(0, np.float32)
+
+        order = np.lexsort((docs, terms))
+        terms, docs, tfs = terms[order], docs[order], tfs[order]
+        vocabulary, starts = np.unique(terms, return_index=True)
+        offsets = np.append(starts, len(terms)).astype(np.int64)
+        return cls(vocabulary, offsets, docs, tfs, lengths, **kwargs)
+
+    def save(self, path: str):
+        for name in BM25_FILES:
+            np.save(os.path.join(path, f"bm25_{name}.npy"), getattr(self, name))
+
+    @classmethod
+    def load(cls, path: str, **kwargs) -> Optional["BM25Index"]:
+        files = [os.path.join(path, f"bm25_{name}.npy") for name in BM25_FILES]
+        if not all(os.path.exists(file) for file in files):
+            return None
+        return cls(*(np.load(file) for file in files), **kwargs)
+
+    def scores(self, text: str) -> np.ndarray:
+        """BM25 score of every document for the query `text`."""
+        scores = np.zeros(len(self.lengths), dtype=np.float32)
+        query = np.unique(hash_tokens(text))
+        positions = np.searchsorted(self.terms, query)
+        for term, i in zip(query, positions):
+            if i >= len(self.terms) or self.terms[i] != term:
+                continue
+            start, end = self.offsets[i], self.offsets[i + 1]
+            docs, tfs = self.docs[start:end], self.tfs[start:end]
+            scores[docs] += self.idf[i] * tfs * (self.k1 + 1) / (
+                tfs + self.norms[docs])
+        return scores
+
+    def search(self, text: str, k: int) -> tuple[np.ndarray, np.ndarray]:
+        """Rows and scores of the `k` best documents sharing a term with
+        the query, best first."""
+        scores = self.scores(text)
+        rows = np.flatnonzero(scores)
+        if k <= 0:
+            rows = rows[:0]
+        if len(rows) > k:
+            rows = rows[np.argpartition(-scores[rows], k - 1)[:k]]
+        rows = rows[np.argsort(-scores[rows], kind="stable")]
+        return rows, scores[rows]
@@ -0,0 +1,232 @@
+import os
+import time
+import random
+import hashlib
+import threading
+
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Optional, Sequence
+
+import numpy as np
+
+from pyteach.utils.logging import get_logger
+
+from .index import LOCAL_INDEX_DIR, Chunk
+
+logger = get_logger()
+
+EMBED_BATCH_SIZE = 25  # text_embedding_v1 limit per request
+CHECKPOINT_DIR = os.getenv(
+    "PYTEACH_RAG_CHECKPOINT",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "checkpoints"))
+
+
+class RateLimiter:
+    """Token bucket shared by the embedding workers, `rate` calls per second."""
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens +
+                                   (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+def retry(fn: Callable, retries: int, backoff: float, what: str):
+    """Call `fn`, retrying with exponential backoff and jitter."""
+    for attempt in range(retries + 1):
+        try:
+            return fn()
+        except Exception as e:
+            if attempt == retries:
+                raise
+            delay = backoff * 2**attempt
+            delay += random.uniform(0, delay / 2)
+            logger.warning(f"{what} failed ({e}), retrying in {delay:.1f}s")
+            time.sleep(delay)
+
+
+class BulkEmbedder:
+    """Embeds a whole corpus in bounded batches that survive interruptions.
+
+    Batches of at most `batch_size` texts are embedded by `workers` threads,
+    no faster than `rate` requests per second, and failed requests are
+    retried with exponential backoff. Every finished batch is saved in
+    `checkpoint_dir` under the hash of the model and its texts, so a build
+    that stopped half way only embeds the batches that are missing when it
+    runs again, and unchanged batches are never paid for twice.
+    """
+
+    def __init__(self,
+                 embed: Callable[[list[str]], Sequence[Sequence[float]]],
+                 model: str,
+                 checkpoint_dir: str = CHECKPOINT_DIR,
+                 batch_size: int = EMBED_BATCH_SIZE,
+                 workers: int = 4,
+                 rate: float = 10.0,
+                 retries: int = 5,
+                 backoff: float = 1.0):
+        self.embed = embed
+        self.model = model
+        self.checkpoint_dir = checkpoint_dir
+        self.batch_size = batch_size
+        self.workers = workers
+        self.limiter = RateLimiter(rate, burst=workers)
+        self.retries = retries
+        self.backoff = backoff
+
+    def _checkpoint(self, texts: list[str]) -> str:
+        digest = hashlib.sha256(self.model.encode("utf-8"))
+        for text in texts:
+            digest.update(b"\x1f" + text.encode("utf-8"))
+        return os.path.join(self.checkpoint_dir, f"{digest.hexdigest()}.npy")
+
+    def _embed_batch(self, texts: list[str], path: str) -> np.ndarray:
+
+        def call():
+            self.limiter.acquire()
+            vectors = np.asarray(self.embed(texts), dtype=np.float32)
+            if len(vectors) != len(texts):
+                raise ValueError(
+                    f"got {len(vectors)} embeddings for {len(texts)} texts")
+            return vectors
+
+        vectors = retry(call, self.retries, self.backoff, "Embedding batch")
+        # Write then rename, a killed build never leaves a partial batch
+        tmp = f"{path}.{threading.get_ident()}.tmp.npy"
+        np.save(tmp, vectors)
+        os.replace(tmp, path)
+        return vectors
+
+    def __call__(self, texts: Sequence[str]) -> np.ndarray:
+        os.makedirs(self.checkpoint_dir, exist_ok=True)
+        batches = [
+            list(texts[i:i + self.batch_size])
+            for i in range(0, len(texts), self.batch_size)
+        ]
+        results: list[Optional[np.ndarray]] = [None] * len(batches)
+        pending = {}
+        for i, batch in enumerate(batches):
+            path = self._checkpoint(batch)
+            if os.path.exists(path):
+                results[i] = np.load(path)
+            else:
+                pending[i] = (batch, path)
+        logger.info(f"Embedding {len(pending)} of {len(batches)} batches, "
+                    f"{len(batches) - len(pending)} restored from checkpoints")
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures = {
+                executor.submit(self._embed_batch, batch, path): i
+                for i, (batch, path) in pending.items()
+            }
+            for done, future in enumerate(as_completed(futures), 1):
+                results[futures[future]] = future.result()
+                logger.info(f"Embedded batch {done}/{len(pending)}")
+
+        if not results:
+            return np.zeros((0, 0), dtype=np.float32)
+        return np.concatenate(results)
+
+
+def upsert_in_chunks(collection,
+                     chunks: Sequence[Chunk],
+                     vectors: np.ndarray,
+                     size: int = 100,
+                     retries: int = 5,
+                     backoff: float = 1.0):
+    """Stream the documents to a DashVector collection `size` at a time."""
+    from dashvector import Doc
+
+    for i in range(0, len(chunks), size):
+        docs = [
+            Doc(id=chunk.id, vector=vector.tolist(), fields={"raw": chunk.text})
+            for chunk, vector in zip(chunks[i:i + size], vectors[i:i + size])
+        ]
+
+        def call():
+            rsp = collection.upsert(docs)
+            if not rsp:
+                raise RuntimeError(f"upsert failed: {rsp.message}")
+
+        retry(call, retries, backoff, "Upsert")
+        logger.info(f"Upserted {min(i + size, len(chunks))}/{len(chunks)} chunks")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from .ingest import CORPUS_DIR, find_notebooks, ingest, parse_notebook
+    from .providers import EMBEDDING_PROVIDER, PROVIDERS, get_provider
+    from .search import RAG_COLLECTION
+
+    parser = argparse.ArgumentParser(
+        description="Embed the course notebooks and build the textbook index")
+    parser.add_argument("--target",
+                        choices=["local", "dashvector"],
+                        default="local")
+    parser.add_argument("--provider",
+                        choices=list(PROVIDERS),
+                        default=EMBEDDING_PROVIDER)
+    parser.add_argument("--corpus", default=CORPUS_DIR)
+    parser.add_argument("--index", default=LOCAL_INDEX_DIR)
+    parser.add_argument("--collection", default=RAG_COLLECTION)
+    parser.add_argument("--checkpoint", default=CHECKPOINT_DIR)
+    parser.add_argument("--batch-size", type=int)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--rate",
+                        type=float,
+                        default=10.0,
+                        help="embedding requests per second")
+    parser.add_argument("--upsert-size", type=int, default=100)
+    parser.add_argument("--force",
+                        action="store_true",
+                        help="re-embed every notebook")
+    args = parser.parse_args()
+
+    provider = get_provider(args.provider)
+    embedder = BulkEmbedder(provider.embed,
+                            model=provider.name,
+                            checkpoint_dir=args.checkpoint,
+                            batch_size=args.batch_size or provider.batch_size,
+                            workers=args.workers,
+                            rate=args.rate)
+    if args.target == "local":
+        print(
+            ingest(embedder,
+                   model=provider.name,
+                   corpus_dir=args.corpus,
+                   index_dir=args.index,
+                   force=args.force))
+    else:
+        from dashvector import Client
+
+        chunks = [
+            chunk for path in find_notebooks(args.corpus)
+            for chunk in parse_notebook(path, args.corpus)
+        ]
+        vectors = embedder([chunk.text for chunk in chunks])
+        client = Client(api_key=os.getenv("RAG_DASHVECTOR_API"),
+                        endpoint=os.getenv("RAG_DASHVECTOR_ENDPOINT"))
+        if not client.get(args.collection):
+            rsp = client.create(args.collection, vectors.shape[1])
+            assert rsp, f"Failed to create collection: {rsp.message}"
+        upsert_in_chunks(client.get(args.collection),
+                         chunks,
+                         vectors,
+                         size=args.upsert_size)
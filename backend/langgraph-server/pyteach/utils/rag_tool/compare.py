@@ -0,0 +1,146 @@
+"""Compare embedding providers on the course notebooks, side by side.
+
+Every provider embeds the notebooks into its own temporary index and is then
+asked every section heading of the corpus, by vector search alone and by the
+hybrid search of the server (vector + BM25 + bigram overlap, fused); a query
+is answered when a chunk of that section comes back. Headings are a cheap, label-free stand-in for
+student questions; they favour lexical providers a little since the heading
+is part of its chunk, so pass real questions with --queries when available
+(JSON lines of {"query": ..., "chunk_ids": [...]}).
+
+    python -m pyteach.utils.rag_tool.compare --providers hashing dashscope ollama
+"""
+import os
+import json
+import time
+import tempfile
+import statistics
+
+from collections import defaultdict
+
+from .build import BulkEmbedder
+from .index import LocalVectorIndex
+from .ingest import CORPUS_DIR, find_notebooks, ingest, parse_notebook
+from .ngrams import clean_text
+from .providers import PROVIDERS, get_provider
+from .search import RetrievalService
+
+
+def heading_queries(corpus_dir: str = CORPUS_DIR) -> list[dict]:
+    sections = defaultdict(list)
+    for path in find_notebooks(corpus_dir):
+        for chunk in parse_notebook(path, corpus_dir):
+            if chunk.metadata.get("heading"):
+                sections[chunk.metadata["heading"]].append(chunk.id)
+    return [{
+        "query": heading,
+        "chunk_ids": chunk_ids
+    } for heading, chunk_ids in sections.items()]
+
+
+def percentile(values: list[float], q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def score(name: str, search, queries: list[dict], k: int) -> dict:
+    latencies, reciprocal_ranks, at_1, at_k = [], [], 0, 0
+    for query in queries:
+        start = time.perf_counter()
+        hits = search(query["query"])
+        latencies.append(time.perf_counter() - start)
+        ranks = [
+            rank for rank, hit in enumerate(hits, 1)
+            if hit.id in query["chunk_ids"]
+        ]
+        at_1 += bool(ranks and ranks[0] == 1)
+        at_k += bool(ranks)
+        reciprocal_ranks.append(1 / ranks[0] if ranks else 0.0)
+    return {
+        "search": name,
+        "recall@1": at_1 / len(queries),
+        f"recall@{k}": at_k / len(queries),
+        "mrr": statistics.mean(reciprocal_ranks),
+        "query_p50_ms": percentile(latencies, 0.5) * 1000,
+        "query_p95_ms": percentile(latencies, 0.95) * 1000,
+    }
+
+
+def evaluate(provider_name: str,
+             queries: list[dict],
+             corpus_dir: str = CORPUS_DIR,
+             k: int = 4,
+             candidates: int = 32) -> list[dict]:
+    provider = get_provider(provider_name)
+    with tempfile.TemporaryDirectory() as index_dir:
+        start = time.perf_counter()
+        embedder = BulkEmbedder(provider.embed,
+                                provider.name,
+                                os.path.join(index_dir, "checkpoints"),
+                                batch_size=provider.batch_size,
+                                retries=1)
+        ingest(embedder, provider.name, corpus_dir, index_dir)
+        build = time.perf_counter() - start
+        index = LocalVectorIndex(index_dir)
+        service = RetrievalService("local", index_dir, provider=provider,
+                                   cache=None)
+        results = [
+            score(provider.name,
+                  lambda q: index.search(provider.embed([q])[0], k), queries,
+                  k),
+            score(f"{provider.name}+bm25",
+                  lambda q: service.retrieve(clean_text(q), k, candidates),
+                  queries, k),
+        ]
+    provider.close()
+    for result in results:
+        result["build_s"] = build
+    return results
+
+
+def print_report(results: list[dict]):
+    columns = list(results[0])
+    rows = [[f"{v:.3f}" if isinstance(v, float) else str(v)
+             for v in result.values()] for result in results]
+    widths = [
+        max(len(column), *(len(row[i]) for row in rows))
+        for i, column in enumerate(columns)
+    ]
+    print("  ".join(c.ljust(w) for c, w in zip(columns, widths)))
+    for row in rows:
+        print("  ".join(v.ljust(w) for v, w in zip(row, widths)))
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--providers",
+                        nargs="+",
+                        choices=list(PROVIDERS),
+                        default=["hashing"])
+    parser.add_argument("--corpus", default=CORPUS_DIR)
+    parser.add_argument("--queries", help="JSON lines of labelled questions")
+    parser.add_argument("-k", type=int, default=4)
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    if args.queries:
+        with open(args.queries, encoding="utf-8") as f:
+            queries = [json.loads(line) for line in f if line.strip()]
+    else:
+        queries = heading_queries(args.corpus)
+
+    results = []
+    for name in args.providers:
+        try:
+            results.extend(evaluate(name, queries, args.corpus, args.k))
+        except Exception as e:
+            # e.g. no network for dashscope, no Ollama running
+            print(f"Skipping {name}: {e}")
+    if results:
+        if args.json:
+            print(json.dumps(results, indent=2))
+        else:
+            print(f"{len(queries)} queries")
+            print_report(results)
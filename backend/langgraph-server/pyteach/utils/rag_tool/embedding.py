@@ -38,6 +38,7 @@ def split_into_chunks(text, chunk_size=512):
     return chunks
 
 
+# Superseded by build.py, which embeds in bounded batches and can resume
 # if __name__ == '__main__':
 #     # 设置 DashScope API Key
 #     dashscope.api_key = os.getenv('DASHSCOPE_API_KEY')
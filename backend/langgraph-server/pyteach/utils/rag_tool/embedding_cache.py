@@ -0,0 +1,128 @@
+import os
+import time
+import sqlite3
+import threading
+
+from typing import Optional, Sequence
+
+import numpy as np
+
+from pyteach.utils.cache import LRUCache, text_key
+from pyteach.utils.memory import get_db_path
+
+EMBEDDING_CACHE_DB = os.getenv("PYTEACH_EMBEDDING_CACHE_DB",
+                               "embedding_cache.sqlite")
+EMBEDDING_CACHE_SIZE = int(os.getenv("PYTEACH_EMBEDDING_CACHE_SIZE", "50000"))
+# float16 halves the disk and memory footprint, the cosine similarities move
+# in the fourth decimal
+EMBEDDING_CACHE_DTYPE = os.getenv("PYTEACH_EMBEDDING_CACHE_DTYPE", "float16")
+
+
+class EmbeddingCache:
+    """Embeddings of past queries keyed by (model, normalized text).
+
+    A classroom working through the same chapter asks the same questions, so
+    most queries need no embedding request at all. Vectors are stored as
+    compact float16 (or float32) blobs in SQLite, so the cache survives
+    restarts, with the most recently used ones also kept in memory. When the
+    disk cache grows beyond `maxsize` the least recently used entries are
+    evicted.
+    """
+
+    def __init__(self,
+                 path: Optional[str] = None,
+                 maxsize: int = EMBEDDING_CACHE_SIZE,
+                 dtype: str = EMBEDDING_CACHE_DTYPE,
+                 memory_size: int = 1024):
+        self.path = path
+        self.maxsize = maxsize
+        self.dtype = np.dtype(dtype)
+        self.memory = LRUCache(maxsize=memory_size)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = sqlite3.connect(
+                self.path or get_db_path(EMBEDDING_CACHE_DB),
+                check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS embeddings ("
+                               "key TEXT PRIMARY KEY, dtype TEXT, "
+                               "vector BLOB, last_used REAL)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS embeddings_lru "
+                               "ON embeddings (last_used)")
+        return self._conn
+
+    def get(self, model: str, text: str) -> Optional[np.ndarray]:
+        key = text_key(model, text)
+        # Queries are embedded from worker threads, the counters and the
+        # in-memory LRU are only touched under the lock
+        with self._lock:
+            vector = self.memory.get(key)
+            if vector is not None:
+                self.hits += 1
+                return vector
+            conn = self._connection()
+            row = conn.execute(
+                "SELECT dtype, vector FROM embeddings WHERE key = ?",
+                (key, )).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            conn.execute("UPDATE embeddings SET last_used = ? WHERE key = ?",
+                         (time.time(), key))
+            conn.commit()
+            self.hits += 1
+            vector = np.frombuffer(row[1], dtype=row[0]).astype(np.float32)
+            self.memory.set(key, vector)
+        return vector
+
+    def set(self, model: str, text: str, vector: Sequence[float]):
+        key = text_key(model, text)
+        vector = np.asarray(vector, dtype=np.float32)
+        with self._lock:
+            self.memory.set(key, vector)
+            conn = self._connection()
+            conn.execute(
+                "INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?, ?)",
+                (key, self.dtype.name, vector.astype(self.dtype).tobytes(),
+                 time.time()))
+            excess = conn.execute("SELECT COUNT(*) FROM embeddings").fetchone(
+            )[0] - self.maxsize
+            if excess > 0:
+                conn.execute(
+                    "DELETE FROM embeddings WHERE key IN (SELECT key FROM "
+                    "embeddings ORDER BY last_used LIMIT ?)", (excess, ))
+                self.evictions += excess
+            conn.commit()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._connection().execute(
+                "SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "memory_hits": self.memory.hits,
+            "evictions": self.evictions,
+            "size": len(self),
+            "maxsize": self.maxsize,
+            "dtype": self.dtype.name,
+        }
+
+
+embedding_cache = EmbeddingCache()
@@ -0,0 +1,214 @@
+import os
+import json
+import shutil
+import tempfile
+
+from typing import Optional, Sequence
+
+import numpy as np
+from pydantic import BaseModel, Field
+
+from .bm25 import BM25Index
+from .ngrams import hash_ngrams, overlap_scores, pack_ngrams
+
+# Where the local textbook index lives, built by `build_local_index`
+LOCAL_INDEX_DIR = os.getenv(
+    "PYTEACH_RAG_INDEX",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "index"))
+
+# Below this many chunks a brute-force scan is faster than IVF
+IVF_MIN_CHUNKS = 4096
+
+
+class Chunk(BaseModel):
+    """A piece of course material stored in the index."""
+    id: str
+    text: str
+    metadata: dict = Field(default_factory=dict)
+
+
+class SearchHit(BaseModel):
+    id: str
+    text: str
+    score: float
+    metadata: dict = Field(default_factory=dict)
+    # Position in the local index, None for hits from the cloud
+    row: Optional[int] = None
+
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def kmeans(vectors: np.ndarray,
+           n_lists: int,
+           iterations: int = 10,
+           seed: int = 0) -> tuple[np.ndarray, np.ndarray]:
+    """Spherical k-means, returns (centroids, assignment of every row)."""
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), n_lists, replace=False)]
+    for _ in range(iterations):
+        assignment = np.argmax(vectors @ centroids.T, axis=1)
+        for i in range(n_lists):
+            members = vectors[assignment == i]
+            if len(members):
+                centroids[i] = members.mean(axis=0)
+        centroids = normalize_rows(centroids)
+    return centroids, np.argmax(vectors @ centroids.T, axis=1)
+
+
+class LocalVectorIndex:
+    """In-process replacement of the DashVector collection.
+
+    Vectors are L2-normalized float32 rows of a memory-mapped .npy file, so
+    the index costs no load time and the OS shares the pages between worker
+    processes. Small corpora are searched brute force with one matrix-vector
+    product; from IVF_MIN_CHUNKS on, an inverted file built with k-means
+    limits the scan to the `nprobe` closest lists.
+
+    The hashed bigrams of every chunk and a BM25 inverted index are stored
+    as well, so the lexical rankings need no text processing of the chunks at
+    query time.
+    """
+
+    def __init__(self, path: str = LOCAL_INDEX_DIR):
+        self.path = path
+        with open(os.path.join(path, "meta.json"), encoding="utf-8") as f:
+            self.meta = json.load(f)
+        self.vectors = np.load(os.path.join(path, "vectors.npy"),
+                               mmap_mode="r")
+        with open(os.path.join(path, "chunks.jsonl"), encoding="utf-8") as f:
+            self.chunks = [Chunk(**json.loads(line)) for line in f]
+
+        self.centroids = self.list_order = self.list_offsets = None
+        if self.meta.get("ivf"):
+            self.centroids = np.load(os.path.join(path, "centroids.npy"))
+            self.list_order = np.load(os.path.join(path, "list_order.npy"))
+            self.list_offsets = np.load(
+                os.path.join(path, "list_offsets.npy"))
+
+        # Indexes built before the n-grams were stored have none
+        self.ngrams = self.ngram_offsets = None
+        if os.path.exists(os.path.join(path, "ngrams.npy")):
+            self.ngrams = np.load(os.path.join(path, "ngrams.npy"),
+                                  mmap_mode="r")
+            self.ngram_offsets = np.load(
+                os.path.join(path, "ngram_offsets.npy"))
+        self.bm25 = BM25Index.load(path) or BM25Index.build(
+            [chunk.text for chunk in self.chunks])
+
+    def __len__(self) -> int:
+        return len(self.chunks)
+
+    @property
+    def model(self) -> Optional[str]:
+        """Embedding model the index was built with."""
+        return self.meta.get("model")
+
+    def _candidates(self, query: np.ndarray, nprobe: int) -> np.ndarray:
+        probes = np.argsort(-(self.centroids @ query))[:nprobe]
+        return np.concatenate([
+            self.list_order[self.list_offsets[i]:self.list_offsets[i + 1]]
+            for i in probes
+        ])
+
+    def ngram_scores(self, query: np.ndarray,
+                     rows: Sequence[int]) -> np.ndarray:
+        """N-gram overlap of the query hashes with the chunks at `rows`."""
+        if self.ngrams is None:
+            arrays = [hash_ngrams(self.chunks[row].text) for row in rows]
+        else:
+            offsets = self.ngram_offsets
+            arrays = [self.ngrams[offsets[row]:offsets[row + 1]] for row in rows]
+        return overlap_scores(query, *pack_ngrams(arrays))
+
+    def search(self,
+               vector: Sequence[float],
+               k: int = 4,
+               nprobe: int = 8) -> list[SearchHit]:
+        query = normalize_rows(np.asarray(vector))
+        if self.centroids is not None:
+            rows = self._candidates(query, nprobe)
+            scores = self.vectors[rows] @ query
+        else:
+            rows = None
+            scores = self.vectors @ query
+
+        k = min(k, len(scores))
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        hits = []
+        for i in top:
+            row = int(rows[i] if rows is not None else i)
+            chunk = self.chunks[row]
+            hits.append(
+                SearchHit(id=chunk.id,
+                          text=chunk.text,
+                          score=float(scores[i]),
+                          metadata=chunk.metadata,
+                          row=row))
+        return hits
+
+
+def _write_index(path: str, chunks: Sequence[Chunk], vectors: np.ndarray,
+                 model: Optional[str], ivf: bool):
+    np.save(os.path.join(path, "vectors.npy"), vectors)
+    with open(os.path.join(path, "chunks.jsonl"), "w", encoding="utf-8") as f:
+        for chunk in chunks:
+            f.write(chunk.model_dump_json() + "\n")
+    ngrams, ngram_offsets = pack_ngrams(
+        [hash_ngrams(chunk.text) for chunk in chunks])
+    np.save(os.path.join(path, "ngrams.npy"), ngrams)
+    np.save(os.path.join(path, "ngram_offsets.npy"), ngram_offsets)
+    BM25Index.build([chunk.text for chunk in chunks]).save(path)
+    if ivf:
+        n_lists = max(1, int(np.sqrt(len(vectors))))
+        centroids, assignment = kmeans(vectors, n_lists)
+        order = np.argsort(assignment, kind="stable")
+        offsets = np.searchsorted(assignment[order], np.arange(n_lists + 1))
+        np.save(os.path.join(path, "centroids.npy"), centroids)
+        np.save(os.path.join(path, "list_order.npy"), order)
+        np.save(os.path.join(path, "list_offsets.npy"), offsets)
+
+    meta = {
+        "count": len(chunks),
+        "dim": int(vectors.shape[1]) if len(vectors) else 0,
+        "model": model,
+        "ivf": ivf,
+    }
+    with open(os.path.join(path, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2)
+
+
+def build_local_index(chunks: Sequence[Chunk],
+                      vectors: Sequence[Sequence[float]],
+                      path: str = LOCAL_INDEX_DIR,
+                      model: Optional[str] = None,
+                      ivf: Optional[bool] = None) -> LocalVectorIndex:
+    """Write chunks and their embeddings as a local index at `path`."""
+    vectors = normalize_rows(np.asarray(vectors))
+    if len(chunks) != len(vectors):
+        raise ValueError(f"{len(chunks)} chunks but {len(vectors)} vectors")
+    if ivf is None:
+        ivf = len(chunks) >= IVF_MIN_CHUNKS
+
+    # The server memory-maps vectors.npy and ngrams.npy: overwriting them in
+    # place would truncate the pages under it (SIGBUS on the next search).
+    # The files are written next to the index and renamed over the old ones,
+    # which stay readable until the last map of them is closed.
+    os.makedirs(path, exist_ok=True)
+    tmp = tempfile.mkdtemp(prefix=".build-", dir=path)
+    try:
+        _write_index(tmp, chunks, vectors, model, ivf)
+        # meta.json last: an index without it is incomplete
+        names = sorted(os.listdir(tmp), key=lambda name: name == "meta.json")
+        for name in names:
+            os.replace(os.path.join(tmp, name), os.path.join(path, name))
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+    return LocalVectorIndex(path)
+
@@ -0,0 +1,175 @@
+import os
+import re
+import glob
+import json
+import hashlib
+
+from typing import Callable, Optional, Sequence
+
+import numpy as np
+
+from .index import (LOCAL_INDEX_DIR, Chunk, LocalVectorIndex,
+                    build_local_index)
+
+# The course notebooks served by JupyterLite
+CORPUS_DIR = os.getenv(
+    "PYTEACH_RAG_CORPUS",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "..",
+                 "..", "jupyterlite-iframe-server", "dev", "files"))
+CORPUS_PATTERN = "chapter*/**/*.ipynb"
+MANIFEST = "manifest.json"
+
+# Sections longer than this are split at cell boundaries
+MAX_CHUNK_CHARS = 1500
+
+HEADING = re.compile(r"^\s*#{1,6}\s+(.+)$", re.MULTILINE)
+ATTACHMENT = re.compile(r"!\[[^\]]*\]\((attachment:|data:)[^)]*\)")
+
+
+def notebook_hash(path: str) -> str:
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def cell_text(cell: dict) -> str:
+    source = cell.get("source", "")
+    source = "".join(source) if isinstance(source, list) else source
+    if cell.get("cell_type") == "code":
+        return f"```python\n{source.strip()}\n```" if source.strip() else ""
+    # Images are pasted as attachments, which are useless as text
+    return ATTACHMENT.sub("", source).strip()
+
+
+def parse_notebook(path: str, root: str = CORPUS_DIR) -> list[Chunk]:
+    """Split a notebook into sections, one chunk per heading.
+
+    A markdown cell starting with a heading opens a new section; the
+    following markdown and code cells belong to it. Sections longer than
+    MAX_CHUNK_CHARS are split at cell boundaries, never inside a cell.
+    """
+    with open(path, encoding="utf-8") as f:
+        cells = json.load(f).get("cells", [])
+    rel_path = os.path.relpath(path, root).replace(os.sep, "/")
+    chapter = rel_path.split("/")[0]
+
+    chunks = []
+    section: list[tuple[int, dict, str]] = []
+    heading = ""
+
+    def flush():
+        if not section:
+            return
+        text = "\n\n".join(text for _, _, text in section)
+        start, end = section[0][0], section[-1][0]
+        chunks.append(
+            Chunk(id=f"{rel_path}#{start}",
+                  text=text,
+                  metadata={
+                      "chapter": chapter,
+                      "notebook": rel_path,
+                      "heading": heading,
+                      "cell_start": start,
+                      "cell_end": end,
+                      "cell_types": sorted({c["cell_type"]
+                                            for _, c, _ in section}),
+                  }))
+        section.clear()
+
+    for i, cell in enumerate(cells):
+        text = cell_text(cell)
+        if not text:
+            continue
+        match = HEADING.match(text) if cell.get(
+            "cell_type") == "markdown" else None
+        size = sum(len(t) for _, _, t in section)
+        if match or size + len(text) > MAX_CHUNK_CHARS:
+            flush()
+        if match:
+            heading = match.group(1).strip()
+        section.append((i, cell, text))
+    flush()
+    return chunks
+
+
+def find_notebooks(corpus_dir: str = CORPUS_DIR,
+                   pattern: str = CORPUS_PATTERN) -> list[str]:
+    return sorted(
+        glob.glob(os.path.join(corpus_dir, pattern), recursive=True))
+
+
+def load_manifest(index_dir: str) -> dict:
+    path = os.path.join(index_dir, MANIFEST)
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def ingest(embed: Callable[[list[str]], Sequence[Sequence[float]]],
+           model: str,
+           corpus_dir: str = CORPUS_DIR,
+           index_dir: str = LOCAL_INDEX_DIR,
+           force: bool = False) -> dict:
+    """(Re)build the local index from the course notebooks.
+
+    Only notebooks whose content hash changed since the last build, or that
+    are new, are chunked and embedded again; the chunks and vectors of the
+    others are carried over from the existing index. Everything is
+    re-embedded when `force` is set or the embedding model changed.
+    """
+    manifest = load_manifest(index_dir)
+    previous: Optional[LocalVectorIndex] = None
+    if not force and manifest.get("model") == model:
+        try:
+            previous = LocalVectorIndex(index_dir)
+        except FileNotFoundError:
+            previous = None
+    old_notebooks = manifest.get("notebooks", {}) if previous else {}
+    old_chunks = {}
+    if previous is not None:
+        old_chunks = {
+            chunk.id: (chunk, previous.vectors[i])
+            for i, chunk in enumerate(previous.chunks)
+        }
+
+    chunks, vectors, notebooks = [], [], {}
+    to_embed: list[Chunk] = []
+    stats = {"unchanged": 0, "changed": 0, "removed": 0}
+    for path in find_notebooks(corpus_dir):
+        rel_path = os.path.relpath(path, corpus_dir).replace(os.sep, "/")
+        digest = notebook_hash(path)
+        old = old_notebooks.get(rel_path)
+        if old and old["sha256"] == digest and all(
+                chunk_id in old_chunks for chunk_id in old["chunks"]):
+            for chunk_id in old["chunks"]:
+                chunk, vector = old_chunks[chunk_id]
+                chunks.append(chunk)
+                vectors.append(np.asarray(vector))
+            notebooks[rel_path] = old
+            stats["unchanged"] += 1
+            continue
+
+        new_chunks = parse_notebook(path, corpus_dir)
+        to_embed.extend(new_chunks)
+        notebooks[rel_path] = {
+            "sha256": digest,
+            "chunks": [chunk.id for chunk in new_chunks]
+        }
+        stats["changed"] += 1
+    stats["removed"] = len(set(old_notebooks) - set(notebooks))
+
+    if to_embed:
+        chunks.extend(to_embed)
+        vectors.extend(
+            np.asarray(vector)
+            for vector in embed([chunk.text for chunk in to_embed]))
+    stats["embedded_chunks"] = len(to_embed)
+    stats["chunks"] = len(chunks)
+
+    if stats["changed"] or stats["removed"] or previous is None:
+        build_local_index(chunks, np.asarray(vectors), index_dir, model=model)
+        with open(os.path.join(index_dir, MANIFEST), "w",
+                  encoding="utf-8") as f:
+            json.dump({"model": model, "notebooks": notebooks}, f, indent=2)
+    return stats
+
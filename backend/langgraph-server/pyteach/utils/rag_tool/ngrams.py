@@ -0,0 +1,74 @@
+import re
+import hashlib
+
+from typing import Sequence
+
+import numpy as np
+
+
+# 文本清洗函数
+def clean_text(text):
+    text = re.sub(r'[^\w\s]', '', text)
+    text = text.lower()
+    return text
+
+
+# N-gram 提取函数
+def get_ngrams(text, N=2):
+    tokens = text.split()
+    ngrams = set(zip(*[tokens[i:] for i in range(N)]))
+    return ngrams
+
+
+def _hash(term: str) -> int:
+    # Stable across processes, unlike hash()
+    return int.from_bytes(
+        hashlib.blake2b(term.encode("utf-8"), digest_size=8).digest(),
+        "little")
+
+
+def hash_ngrams(text: str, N: int = 2) -> np.ndarray:
+    """Sorted, unique 64-bit hashes of the n-grams of the cleaned text.
+
+    The hash is stable across processes, so the arrays can be computed at
+    index time and compared with the ones of a query later.
+    """
+    hashes = {
+        _hash(" ".join(ngram))
+        for ngram in get_ngrams(clean_text(text), N)
+    }
+    return np.array(sorted(hashes), dtype=np.uint64)
+
+
+def hash_tokens(text: str) -> np.ndarray:
+    """64-bit hashes of the words of the cleaned text, in order."""
+    return np.array([_hash(token) for token in clean_text(text).split()],
+                    dtype=np.uint64)
+
+
+def pack_ngrams(arrays: Sequence[np.ndarray]) -> tuple[np.ndarray, np.ndarray]:
+    """Concatenate per-document hash arrays, returns (hashes, offsets)."""
+    offsets = np.zeros(len(arrays) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(a) for a in arrays])
+    hashes = (np.concatenate(arrays)
+              if len(arrays) else np.zeros(0)).astype(np.uint64)
+    return hashes, offsets
+
+
+def overlap_scores(query: np.ndarray, hashes: np.ndarray,
+                   offsets: np.ndarray) -> np.ndarray:
+    """Improved Jaccard, |q ∩ d| / min(|q|, |d|), of every packed document.
+
+    One `np.isin` over all documents at once; the per-document intersection
+    sizes are differences of the running count at the document offsets.
+    """
+    sizes = np.diff(offsets)
+    if len(query) == 0 or len(sizes) == 0:
+        return np.zeros(len(sizes))
+    running = np.concatenate(([0], np.cumsum(np.isin(hashes, query))))
+    intersection = running[offsets[1:]] - running[offsets[:-1]]
+    min_size = np.minimum(sizes, len(query))
+    return np.divide(intersection,
+                     min_size,
+                     out=np.zeros(len(sizes)),
+                     where=min_size > 0)
@@ -0,0 +1,163 @@
+import os
+import hashlib
+import functools
+import threading
+
+from abc import ABC, abstractmethod
+from typing import Optional
+
+import numpy as np
+import dashscope
+import requests
+from requests.adapters import HTTPAdapter
+
+from .ngrams import clean_text
+
+# Which provider embeds the textbook and the questions: "dashscope" (cloud),
+# "hashing" (offline, no model) or "ollama" (offline, local model)
+EMBEDDING_PROVIDER = os.getenv("PYTEACH_EMBEDDING_PROVIDER", "dashscope")
+OLLAMA_EMBEDDING_MODEL = os.getenv("PYTEACH_OLLAMA_EMBEDDING_MODEL",
+                                   "nomic-embed-text")
+HASHING_DIM = int(os.getenv("PYTEACH_HASHING_DIM", "4096"))
+
+
+class EmbeddingProvider(ABC):
+    """Turns texts into vectors for the textbook index and the questions.
+
+    `name` identifies the embedding space; it is stored in the index, so an
+    index is never searched with vectors of another provider.
+    """
+    name: str
+    # Most texts a single `embed` call accepts
+    batch_size: int = 25
+
+    @abstractmethod
+    def embed(self, texts: list[str]) -> list[list[float]]:
+        ...
+
+    def close(self):
+        pass
+
+
+class DashScopeEmbeddings(EmbeddingProvider):
+    """DashScope text_embedding_v1 over one pooled HTTP session.
+
+    The SDK opens a new session, and TLS connection, for every call, so the
+    REST endpoint is called directly instead.
+    """
+    name = "text_embedding_v1"
+    batch_size = 25
+
+    def __init__(self, pool_size: int = 8, timeout: float = 10.0):
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self._session: Optional[requests.Session] = None
+        self._lock = threading.Lock()
+
+    def _http(self) -> requests.Session:
+        with self._lock:
+            if self._session is None:
+                session = requests.Session()
+                session.mount(
+                    "https://",
+                    HTTPAdapter(pool_connections=1,
+                                pool_maxsize=self.pool_size))
+                session.headers["Authorization"] = (
+                    f"Bearer {os.getenv('RAG_DASHSCOPE_API')}")
+                self._session = session
+            return self._session
+
+    def embed(self, texts: list[str]) -> list[list[float]]:
+        response = self._http().post(
+            f"{dashscope.base_http_api_url}/services/embeddings/"
+            "text-embedding/text-embedding",
+            json={
+                "model": "text-embedding-v1",
+                "input": {
+                    "texts": texts
+                },
+                "parameters": {}
+            },
+            timeout=self.timeout)
+        response.raise_for_status()
+        records = sorted(response.json()["output"]["embeddings"],
+                         key=lambda record: record["text_index"])
+        return [record["embedding"] for record in records]
+
+    def close(self):
+        with self._lock:
+            if self._session is not None:
+                self._session.close()
+            self._session = None
+
+
+@functools.lru_cache(maxsize=65536)
+def _feature(token: str, dim: int) -> tuple[int, float]:
+    digest = int.from_bytes(
+        hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest(),
+        "little")
+    return digest % dim, 1.0 if digest >> 63 else -1.0
+
+
+class HashingEmbeddings(EmbeddingProvider):
+    """Signed feature hashing of word unigrams and bigrams, no model at all.
+
+    Term frequencies are dampened with log1p so that repeated words do not
+    dominate. Purely lexical, but fully offline, deterministic and
+    microseconds per text, which makes it the baseline for tests and
+    benchmarks.
+    """
+    batch_size = 1024
+
+    def __init__(self, dim: int = HASHING_DIM):
+        self.dim = dim
+        self.name = f"hashing-{dim}"
+
+    def _vector(self, text: str) -> np.ndarray:
+        tokens = clean_text(text).split()
+        features = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for feature in features:
+            i, sign = _feature(feature, self.dim)
+            vector[i] += sign
+        vector = np.sign(vector) * np.log1p(np.abs(vector))
+        return vector / max(np.linalg.norm(vector), 1e-12)
+
+    def embed(self, texts: list[str]) -> list[list[float]]:
+        return [self._vector(text).tolist() for text in texts]
+
+
+class OllamaEmbeddings(EmbeddingProvider):
+    """A small embedding model served by the local Ollama, e.g.
+    nomic-embed-text or all-minilm.
+    """
+    batch_size = 64
+
+    def __init__(self, model: str = OLLAMA_EMBEDDING_MODEL):
+        from ollama import Client
+        from pyteach.utils.models import OLLAMA_BASE, OLLAMA_KEEP_ALIVE
+
+        self.model = model
+        self.name = f"ollama-{model}"
+        self.keep_alive = OLLAMA_KEEP_ALIVE
+        self.client = Client(host=OLLAMA_BASE)
+
+    def embed(self, texts: list[str]) -> list[list[float]]:
+        response = self.client.embed(model=self.model,
+                                     input=texts,
+                                     keep_alive=self.keep_alive)
+        return [list(vector) for vector in response["embeddings"]]
+
+
+PROVIDERS = {
+    "dashscope": DashScopeEmbeddings,
+    "hashing": HashingEmbeddings,
+    "ollama": OllamaEmbeddings,
+}
+
+
+def get_provider(name: str = EMBEDDING_PROVIDER) -> EmbeddingProvider:
+    if name not in PROVIDERS:
+        raise ValueError(f"Unknown embedding provider {name!r}, "
+                         f"choose one of {', '.join(PROVIDERS)}")
+    return PROVIDERS[name]()
@@ -1,19 +1,192 @@
-from dashvector import Client
-from .embedding import generate_embeddings
-import dashscope
 import os
+import asyncio
+import threading
+
+from collections import defaultdict
+from typing import Optional
+
+import numpy as np
+from dashvector import Client
+
+from .embedding_cache import EmbeddingCache, embedding_cache
+from .index import LOCAL_INDEX_DIR, LocalVectorIndex, SearchHit
+from .ngrams import hash_ngrams, overlap_scores, pack_ngrams
+from .providers import EmbeddingProvider, get_provider
+
+# "local" searches the in-process index, built with `build`, "dashvector"
+# the cloud collection
+RAG_BACKEND = os.getenv("PYTEACH_RAG_BACKEND", "dashvector")
+RAG_COLLECTION = os.getenv("PYTEACH_RAG_COLLECTION", "tutorial_embedings")
+# Damping of reciprocal rank fusion, 60 is the value of the original paper
+RRF_K = int(os.getenv("PYTEACH_RRF_K", "60"))
+
+
+def reciprocal_rank_fusion(rankings: list[list[str]],
+                           k: int = RRF_K) -> dict[str, float]:
+    """Sum of 1 / (k + rank) over the rankings each document appears in."""
+    scores = defaultdict(float)
+    for ranking in rankings:
+        for rank, key in enumerate(ranking, 1):
+            scores[key] += 1 / (k + rank)
+    return dict(scores)
+
+
+class RetrievalService:
+    """Embeds questions and searches the textbook, set up once per process.
+
+    The embedding `provider` and the collection handle (whose gRPC channel
+    stays open) or the local index are kept from `start` to `close`, so a
+    question costs one embedding request and one search, and repeated
+    questions skip the embedding request thanks to the persistent `cache`.
+    """
+
+    def __init__(self,
+                 backend: str = RAG_BACKEND,
+                 index_path: str = LOCAL_INDEX_DIR,
+                 collection_name: str = RAG_COLLECTION,
+                 provider: Optional[EmbeddingProvider] = None,
+                 timeout: float = 10.0,
+                 cache: Optional[EmbeddingCache] = embedding_cache):
+        self.backend = backend
+        self.index_path = index_path
+        self.collection_name = collection_name
+        self._provider = provider
+        self.timeout = timeout
+        self.cache = cache
+        self.index: Optional[LocalVectorIndex] = None
+        self.collection = None
+        self._lock = threading.Lock()
+
+    @property
+    def started(self) -> bool:
+        return self.index is not None or self.collection is not None
+
+    @property
+    def provider(self) -> EmbeddingProvider:
+        # Created on first use, so importing this module needs no credentials
+        if self._provider is None:
+            self._provider = get_provider()
+        return self._provider
+
+    def start(self):
+        with self._lock:
+            if self.started:
+                return
+            if self.backend == "local":
+                index = LocalVectorIndex(self.index_path)
+                if index.model != self.provider.name:
+                    raise ValueError(
+                        f"The textbook index was embedded with {index.model}, "
+                        f"not {self.provider.name}, rebuild it or change "
+                        f"PYTEACH_EMBEDDING_PROVIDER")
+                self.index = index
+            else:
+                client = Client(api_key=os.getenv("RAG_DASHVECTOR_API"),
+                                endpoint=os.getenv("RAG_DASHVECTOR_ENDPOINT"),
+                                timeout=self.timeout)
+                self.collection = client.get(self.collection_name)
+                assert self.collection, self.collection.message
+
+    def close(self):
+        with self._lock:
+            if self._provider is not None:
+                self._provider.close()
+            self.index = self.collection = None
+        if self.cache is not None:
+            self.cache.close()
+
+    def embed(self, texts: list[str]) -> list[list[float]]:
+        return self.provider.embed(texts)
+
+    def embed_query(self, question: str) -> list[float]:
+        if self.cache is None:
+            return self.embed([question])[0]
+        vector = self.cache.get(self.provider.name, question)
+        if vector is None:
+            vector = self.embed([question])[0]
+            self.cache.set(self.provider.name, question, vector)
+        return vector
+
+    def query(self, question: str, k: int) -> list[SearchHit]:
+        self.start()
+        vector = self.embed_query(question)
+        if self.backend == "local":
+            return self.index.search(vector, k)
+
+        rsp = self.collection.query(vector, output_fields=['raw'], topk=k)
+        assert rsp
+        return [
+            SearchHit(id=doc.id, text=doc.fields['raw'], score=doc.score)
+            for doc in rsp.output
+        ]
+
+    async def aquery(self, question: str, k: int) -> list[SearchHit]:
+        # The session and the gRPC stub block, the pool lets the threads
+        # share connections
+        return await asyncio.to_thread(self.query, question, k)
+
+    def retrieve(self, question: str, k: int,
+                 candidates: int) -> list[SearchHit]:
+        """Hybrid search, the best `k` of the vector, BM25 and bigram-overlap
+        rankings fused with reciprocal rank fusion.
+
+        Each ranking contributes its best `candidates` documents, and a
+        document only has to appear in one of them, so a short question that
+        shares no bigram with the text still gets the vector hits back. BM25
+        runs in-process on the local index (not for the cloud backend), so
+        the only network call is the embedding of the question.
+        """
+        hits = self.query(question, candidates)
+        by_id = {hit.id: hit for hit in hits}
+        rankings = [[hit.id for hit in hits]]
+        if self.index is not None:
+            rows, _ = self.index.bm25.search(question, candidates)
+            for row in rows:
+                chunk = self.index.chunks[row]
+                by_id.setdefault(
+                    chunk.id,
+                    SearchHit(id=chunk.id,
+                              text=chunk.text,
+                              score=0.0,
+                              metadata=chunk.metadata,
+                              row=int(row)))
+            rankings.append([self.index.chunks[row].id for row in rows])
+
+        pool = list(by_id.values())
+        overlap = self.ngram_scores(hash_ngrams(question), pool)
+        order = np.argsort(-overlap, kind="stable")
+        rankings.append([pool[i].id for i in order if overlap[i] > 0])
+
+        fused = reciprocal_rank_fusion(rankings)
+        best = sorted(fused, key=fused.get, reverse=True)[:k]
+        return [by_id[key].model_copy(update={"score": fused[key]})
+                for key in best]
+
+    async def aretrieve(self, question: str, k: int,
+                        candidates: int) -> list[SearchHit]:
+        return await asyncio.to_thread(self.retrieve, question, k, candidates)
+
+    def ngram_scores(self, query: np.ndarray,
+                     hits: list[SearchHit]) -> np.ndarray:
+        """N-gram overlap of the query hashes with every hit, in hit order."""
+        if (self.index is not None and hits
+                and all(hit.row is not None for hit in hits)):
+            return self.index.ngram_scores(query, [hit.row for hit in hits])
+        # Cloud hits come without precomputed n-grams
+        return overlap_scores(
+            query, *pack_ngrams([hash_ngrams(hit.text) for hit in hits]))
+
+    def stats(self) -> dict:
+        return {
+            "backend": self.backend,
+            "embedding_provider": self.provider.name,
+            "embedding_cache": self.cache.stats() if self.cache else None,
+        }
+
 
+retrieval_service = RetrievalService()
 
-def search_relevant_text(question, k):
-    dashscope.api_key = os.getenv("RAG_DASHSCOPE_API")
-    client = Client(api_key=os.getenv("RAG_DASHVECTOR_API"),
-                    endpoint=os.getenv("RAG_DASHVECTOR_ENDPOINT"))
 
-    collection = client.get('tutorial_embedings')
-    assert collection
+def search_relevant_text(question, k) -> list[SearchHit]:
+    return retrieval_service.query(question, k)
 
-    rsp = collection.query(generate_embeddings(question),
-                           output_fields=['raw'],
-                           topk=k)
-    assert rsp
-    return rsp
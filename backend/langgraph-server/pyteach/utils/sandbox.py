@@ -0,0 +1,305 @@
+import os
+import ast
+import sys
+import json
+import asyncio
+import builtins
+import queue
+import select
+import shutil
+import hashlib
+import tempfile
+import threading
+import subprocess
+
+from typing import Literal, Optional
+from pydantic import BaseModel
+
+from pyteach.utils.cache import LRUCache
+from pyteach.utils.logging import get_logger
+
+logger = get_logger()
+
+SANDBOX_WORKERS = int(os.getenv("PYTEACH_SANDBOX_WORKERS", "2"))
+# Wall-clock seconds a snippet may run, and address space of a worker
+SANDBOX_TIMEOUT = float(os.getenv("PYTEACH_SANDBOX_TIMEOUT", "5"))
+SANDBOX_MEMORY_MB = int(os.getenv("PYTEACH_SANDBOX_MEMORY_MB", "512"))
+SANDBOX_MAX_OUTPUT = 4096
+
+# Runs in the worker interpreter. Requests and results are JSON lines on a
+# private copy of stdout; fd 1 and 2 go to /dev/null so that snippets
+# writing to sys.__stdout__ cannot corrupt the protocol.
+WORKER_SOURCE = r'''
+import io, os, sys, json, builtins, traceback, contextlib
+try:
+    import resource
+    limit = int(sys.argv[1]) * 1024 * 1024
+    if limit > 0:
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+except (ImportError, ValueError, OSError):
+    pass
+max_output = int(sys.argv[2])
+
+requests = sys.stdin
+results = os.fdopen(os.dup(1), "w")
+devnull = os.open(os.devnull, os.O_WRONLY)
+os.dup2(devnull, 1)
+os.dup2(devnull, 2)
+sys.stdin = io.StringIO("")
+
+# One snippet per interpreter: modules, patched builtins and threads of a
+# snippet never reach the next one
+code = json.loads(requests.readline())["code"]
+stdout, stderr = io.StringIO(), io.StringIO()
+result = {"ok": True, "error": ""}
+try:
+    with contextlib.redirect_stdout(stdout), \
+            contextlib.redirect_stderr(stderr):
+        exec(compile(code, "<cell>", "exec"), {
+            "__name__": "__main__",
+            "__builtins__": builtins,
+        })
+except SystemExit as e:
+    if e.code not in (None, 0):
+        result = {"ok": False, "error": f"SystemExit: {e.code}"}
+except BaseException as e:
+    result = {"ok": False, "error": f"{type(e).__name__}: {e}"}
+    frames = [
+        frame for frame in traceback.extract_tb(e.__traceback__)
+        if frame.filename == "<cell>"
+    ]
+    if frames:
+        result["lineno"] = frames[-1].lineno
+result["stdout"] = stdout.getvalue()[:max_output]
+result["stderr"] = stderr.getvalue()[:max_output]
+results.write(json.dumps(result) + "\n")
+results.flush()
+'''
+
+
+class SandboxResult(BaseModel):
+    ok: bool
+    error: str = ""
+    lineno: Optional[int] = None
+    stdout: str = ""
+    stderr: str = ""
+    timed_out: bool = False
+    # The interpreter died without reporting a result
+    crashed: bool = False
+    # "static" when the code was rejected without running it
+    stage: Literal["static", "execution"] = "execution"
+
+    @property
+    def feedback(self) -> str:
+        where = f" (line {self.lineno})" if self.lineno else ""
+        return f"{self.error}{where}"
+
+
+# ======================================================================================
+# ================================= Static check =======================================
+# ======================================================================================
+BUILTIN_NAMES = set(dir(builtins)) | {"__name__", "__file__", "__doc__"}
+
+
+def defined_names(tree: ast.AST) -> set[str]:
+    """Every name the code binds somewhere, regardless of scope and order."""
+    names = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name) and not isinstance(node.ctx, ast.Load):
+            names.add(node.id)
+        elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef,
+                               ast.ClassDef)):
+            names.add(node.name)
+        elif isinstance(node, ast.arg):
+            names.add(node.arg)
+        elif isinstance(node, ast.alias):
+            names.add((node.asname or node.name).split(".")[0])
+        elif isinstance(node, (ast.ExceptHandler, ast.MatchAs, ast.MatchStar)):
+            if node.name:
+                names.add(node.name)
+        elif isinstance(node, ast.MatchMapping) and node.rest:
+            names.add(node.rest)
+        elif isinstance(node, (ast.Global, ast.Nonlocal)):
+            names.update(node.names)
+    return names
+
+
+def static_check(code: str) -> Optional[SandboxResult]:
+    """Catch syntax errors and undefined names without running the code.
+
+    The name check is deliberately lenient: a name counts as defined if it is
+    bound anywhere in the code, and code that can create names dynamically
+    (star imports) is left to the execution. Returns None when the code
+    passed.
+    """
+    try:
+        tree = ast.parse(code, filename="<cell>")
+        compile(tree, "<cell>", "exec")
+    except SyntaxError as e:
+        return SandboxResult(ok=False,
+                             error=f"{type(e).__name__}: {e.msg}",
+                             lineno=e.lineno,
+                             stage="static")
+
+    if any(
+            isinstance(node, ast.ImportFrom) and node.names[0].name == "*"
+            for node in ast.walk(tree)):
+        return None
+    known = defined_names(tree) | BUILTIN_NAMES
+    for node in ast.walk(tree):
+        if (isinstance(node, ast.Name) and isinstance(node.ctx, ast.Load)
+                and node.id not in known):
+            return SandboxResult(
+                ok=False,
+                error=f"NameError: name '{node.id}' is not defined",
+                lineno=node.lineno,
+                stage="static")
+    return None
+
+
+# ======================================================================================
+# ================================== Execution =========================================
+# ======================================================================================
+class SandboxWorker:
+    """A pre-started interpreter that executes a single snippet."""
+
+    def __init__(self,
+                 memory_mb: int = SANDBOX_MEMORY_MB,
+                 max_output: int = SANDBOX_MAX_OUTPUT):
+        self.cwd = tempfile.mkdtemp(prefix="pyteach-sandbox-")
+        self.process = subprocess.Popen(
+            [
+                sys.executable, "-u", "-c", WORKER_SOURCE,
+                str(memory_mb),
+                str(max_output)
+            ],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            cwd=self.cwd,
+            text=True,
+        )
+
+    @property
+    def alive(self) -> bool:
+        return self.process.poll() is None
+
+    def run(self, code: str, timeout: float) -> SandboxResult:
+        self.process.stdin.write(json.dumps({"code": code}) + "\n")
+        self.process.stdin.flush()
+        ready, _, _ = select.select([self.process.stdout], [], [], timeout)
+        if not ready:
+            self.kill()
+            return SandboxResult(
+                ok=False,
+                error=f"TimeoutError: execution took longer than {timeout}s",
+                timed_out=True)
+        line = self.process.stdout.readline()
+        if not line:
+            # The interpreter died, e.g. killed for exceeding the memory limit
+            self.kill()
+            return SandboxResult(
+                ok=False,
+                error=f"RuntimeError: the interpreter exited with code "
+                f"{self.process.returncode}",
+                crashed=True)
+        return SandboxResult(**json.loads(line))
+
+    def kill(self):
+        if self.alive:
+            self.process.kill()
+        self.process.wait()
+        shutil.rmtree(self.cwd, ignore_errors=True)
+
+
+class SandboxPool:
+    """Pool of sandbox workers with a result cache keyed by the code hash.
+
+    Every snippet runs in its own interpreter, with a wall-clock timeout and
+    a memory limit, so an endless loop or a huge allocation in
+    LLM-generated code only costs a worker, which is replaced, instead of
+    stalling the server. Workers are started ahead of time (`start`), so a
+    validation only pays the execution itself, and code that fails
+    `static_check` is rejected without reaching a worker at all.
+    """
+
+    def __init__(self,
+                 size: int = SANDBOX_WORKERS,
+                 timeout: float = SANDBOX_TIMEOUT,
+                 memory_mb: int = SANDBOX_MEMORY_MB,
+                 cache_size: int = 1024):
+        self.size = size
+        self.timeout = timeout
+        self.memory_mb = memory_mb
+        self.cache = LRUCache(maxsize=cache_size)
+        self._idle: queue.Queue[SandboxWorker] = queue.Queue()
+        self._started = 0
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            while self._started < self.size:
+                self._idle.put(SandboxWorker(self.memory_mb))
+                self._started += 1
+
+    def close(self):
+        with self._lock:
+            while not self._idle.empty():
+                self._idle.get().kill()
+            self._started = 0
+
+    def _lookup(self, code: str) -> tuple[str, Optional[SandboxResult]]:
+        """Cached result or static check failure, if any, without a worker."""
+        key = hashlib.sha256(code.encode("utf-8")).hexdigest()
+        result = self.cache.get(key)
+        if result is None:
+            # Most broken snippets never need a worker
+            result = static_check(code)
+            if result is not None:
+                self.cache.set(key, result)
+        return key, result
+
+    def _execute(self, code: str, key: str,
+                 timeout: Optional[float]) -> SandboxResult:
+        self.start()
+        worker = self._idle.get()
+        cacheable = False
+        try:
+            result = worker.run(code,
+                                self.timeout if timeout is None else timeout)
+            # Only what the code itself did is deterministic: a timeout may
+            # be load, a dead worker the sandbox failing under it
+            cacheable = not (result.timed_out or result.crashed)
+        except (OSError, ValueError) as e:
+            result = SandboxResult(ok=False, error=f"SandboxError: {e}")
+        finally:
+            # Workers are used once, the replacement starts in the background
+            worker.kill()
+            self._idle.put(SandboxWorker(self.memory_mb))
+
+        if cacheable:
+            self.cache.set(key, result)
+        return result
+
+    def run(self,
+            code: str,
+            timeout: Optional[float] = None) -> SandboxResult:
+        key, result = self._lookup(code)
+        if result is not None:
+            return result
+        return self._execute(code, key, timeout)
+
+    async def arun(self,
+                   code: str,
+                   timeout: Optional[float] = None) -> SandboxResult:
+        key, result = self._lookup(code)
+        if result is not None:
+            return result
+        # Waiting on the worker pipe blocks, keep it off the event loop
+        return await asyncio.to_thread(self._execute, code, key, timeout)
+
+    def stats(self) -> dict:
+        return {"workers": self._started, **self.cache.stats()}
+
+
+sandbox_pool = SandboxPool()
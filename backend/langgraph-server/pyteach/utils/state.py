@@ -38,6 +38,12 @@ class TeacherState(TypedDict):
     stm_pointer: str  # shot time memory pointer
 
 
+class SpeculativeTeacherState(TeacherState):
+    # Private states of the input guard, judged alongside the teacher
+    guard_judgement: str
+    judgement_category: str
+
+
 class OutputGuardState(TypedDict):
     output_message: BaseMessage
     guard_judgement: str
@@ -1,15 +1,40 @@
-import uuid
-import socketio
+import os
 
-from langchain_core.tools import tool
+from typing import Optional
+
+from langchain_core.runnables import RunnableConfig
+from langchain_core.tools import StructuredTool
 
 from pyteach.utils.rag_tool import RAG
 from pyteach.utils.logging import get_logger
+from pyteach.utils.notebook import (NOTEBOOK_TIMEOUT, notebook_channel,
+                                    notebook_context)
+from pyteach.utils.prebuilt import ToolPolicy
+from pyteach.utils.sandbox import (SANDBOX_TIMEOUT, SANDBOX_WORKERS,
+                                   SandboxResult, sandbox_pool)
 
 logger = get_logger()
 
 
-@tool(parse_docstring=True)
+def tool_with_async(coroutine, parse_docstring: bool = False):
+    """Make the decorated function a tool with `coroutine` as its native async
+    implementation, used by `ainvoke` instead of running the sync one in a
+    thread. Name, description and arguments come from the sync function.
+    """
+
+    def decorator(func) -> StructuredTool:
+        return StructuredTool.from_function(func=func,
+                                            coroutine=coroutine,
+                                            parse_docstring=parse_docstring)
+
+    return decorator
+
+
+async def aRAG_on_textbook(user_query: str) -> str:
+    return await RAG.arag_function(user_query)
+
+
+@tool_with_async(aRAG_on_textbook, parse_docstring=True)
 def RAG_on_textbook(user_query: str) -> str:
     """Retrieve context in the Kids Python textbook. Call this tool when the user query the textbook.
 
@@ -22,25 +47,45 @@ def RAG_on_textbook(user_query: str) -> str:
     return RAG.rag_function(user_query)
 
 
-def _get_what_user_is_reading() -> str:
-    with socketio.SimpleClient() as sio:
-        sio.connect('http://localhost:3001')
+# Answer of the notebook tools for a chat that is not opened next to a
+# notebook, rather than asking every notebook and reading another student's
+NO_NOTEBOOK_CONTEXT = (
+    "There is no notebook connected to this chat. Ask the user to open the "
+    "lecture notebook, or to paste the codes or text into the chat.")
 
-        as_info = dict(source_id="getActiveCellContent" + str(uuid.uuid4()),
-                       source_type="AS")
-        sio.emit("register", as_info)
 
-        data = as_info.copy()
-        data["task"] = "getActiveCellContent"
-        sio.emit("from_AS_to_socket", data)
-        event_type, response = sio.receive()
-        return response
+def _get_what_user_is_reading(thread_id: Optional[str] = None) -> Optional[dict]:
+    # The notebook pushes every active-cell change, only ask it when nothing
+    # was pushed yet (e.g. right after a restart), and only the chat's page
+    client_id = notebook_context.client(thread_id)
+    if client_id is None:
+        return None
+    snapshot = notebook_context.get(thread_id)
+    if snapshot is not None:
+        return {"jupyterlite_info": snapshot.jupyterlite_info}
+    return notebook_channel.request("getActiveCellContent",
+                                    client_id=client_id)
 
 
-@tool
-def get_what_user_is_reading() -> str:
-    """This tool provides what user is reading in the jupyter notebook. Call this tool when the context is insufficent to answer the user's question."""  # noqa
-    response = _get_what_user_is_reading()
+async def _aget_what_user_is_reading(
+        thread_id: Optional[str] = None) -> Optional[dict]:
+    client_id = notebook_context.client(thread_id)
+    if client_id is None:
+        return None
+    snapshot = notebook_context.get(thread_id)
+    if snapshot is not None:
+        return {"jupyterlite_info": snapshot.jupyterlite_info}
+    return await notebook_channel.arequest("getActiveCellContent",
+                                           client_id=client_id)
+
+
+def _thread_id(config: RunnableConfig) -> Optional[str]:
+    return config.get("configurable", {}).get("thread_id")
+
+
+def _describe_reading(response: Optional[dict]) -> str:
+    if response is None:
+        return NO_NOTEBOOK_CONTEXT
     info = response["jupyterlite_info"]
     cell_content = info["ActiveCellContent"]
     cell_type = info["ActiveCellType"]
@@ -54,10 +99,20 @@ def get_what_user_is_reading() -> str:
     return result
 
 
-@tool
-def get_user_codes() -> str:
-    """Call this tool when you need access of user's codes."""  # noqa
-    response = _get_what_user_is_reading()
+async def aget_what_user_is_reading(config: RunnableConfig) -> str:
+    return _describe_reading(await _aget_what_user_is_reading(
+        _thread_id(config)))
+
+
+@tool_with_async(aget_what_user_is_reading)
+def get_what_user_is_reading(config: RunnableConfig) -> str:
+    """This tool provides what user is reading in the jupyter notebook. Call this tool when the context is insufficent to answer the user's question."""  # noqa
+    return _describe_reading(_get_what_user_is_reading(_thread_id(config)))
+
+
+def _describe_user_codes(response: Optional[dict]) -> str:
+    if response is None:
+        return NO_NOTEBOOK_CONTEXT
     info = response["jupyterlite_info"]
     cell_content = info["ActiveCellContent"]
     cell_type = info["ActiveCellType"]
@@ -69,29 +124,36 @@ def get_user_codes() -> str:
     return result
 
 
-def _write_codes_to_new_cell(codes: str) -> str:
-    with socketio.SimpleClient() as sio:
-        sio.connect('http://localhost:3001')
+async def aget_user_codes(config: RunnableConfig) -> str:
+    return _describe_user_codes(await _aget_what_user_is_reading(
+        _thread_id(config)))
 
-        as_info = dict(source_id="writeContentToCell" + str(uuid.uuid4()),
-                       source_type="AS")
-        sio.emit("register", as_info)
 
-        data = as_info.copy()
-        data["task"] = "writeContentToCell"
-        data["newContent"] = codes
-        sio.emit("from_AS_to_socket", data)
-        event_type, response = sio.receive()
-        return response
+@tool_with_async(aget_user_codes)
+def get_user_codes(config: RunnableConfig) -> str:
+    """Call this tool when you need access of user's codes."""  # noqa
+    return _describe_user_codes(_get_what_user_is_reading(_thread_id(config)))
 
 
-def _validate_codes(codes: str) -> str:
+def _write_codes_to_new_cell(codes: str,
+                             client_id: Optional[str] = None) -> dict:
+    return notebook_channel.request("writeContentToCell",
+                                    newContent=codes,
+                                    client_id=client_id)
+
+
+async def _awrite_codes_to_new_cell(codes: str,
+                                    client_id: Optional[str] = None) -> dict:
+    return await notebook_channel.arequest("writeContentToCell",
+                                           newContent=codes,
+                                           client_id=client_id)
+
+
+def _validation_feedback(result: SandboxResult) -> str:
     # code validation before write codes. if codes are not executable, return "fail: {reason}""
-    # Check execution
-    try:
-        exec(codes)
-    except Exception as e:
-        error_message = [("user", f"Your solution failed the code execution test, error_message: {e} You should regenerate the code and call the tool 'write_codes_to_new_cell' again to write the correct version of the Python code into a new notebook cell.")]
+    if not result.ok:
+        test = "static check" if result.stage == "static" else "code execution test"
+        error_message = [("user", f"Your solution failed the {test}, error_message: {result.feedback} You should regenerate the code and call the tool 'write_codes_to_new_cell' again to write the correct version of the Python code into a new notebook cell.")]
         logger.debug("---CODE BLOCK CHECK: FAILED---")
         return error_message
 
@@ -100,8 +162,30 @@ def _validate_codes(codes: str) -> str:
     return "success"
 
 
-@tool(parse_docstring=True)
-def write_codes_to_new_cell(codes: str) -> str:
+def _validate_codes(codes: str) -> str:
+    # Static check (syntax, undefined names) first, then execution in a
+    # sandboxed worker rather than in the server
+    return _validation_feedback(sandbox_pool.run(codes))
+
+
+async def _avalidate_codes(codes: str) -> str:
+    return _validation_feedback(await sandbox_pool.arun(codes))
+
+
+async def awrite_codes_to_new_cell(codes: str, config: RunnableConfig) -> str:
+    client_id = notebook_context.client(_thread_id(config))
+    if client_id is None:
+        return f"fail: {NO_NOTEBOOK_CONTEXT}"
+    validation_result = await _avalidate_codes(codes)
+    if validation_result == "success":
+        await _awrite_codes_to_new_cell(codes, client_id)
+        return "success"
+    else:
+        return validation_result
+
+
+@tool_with_async(awrite_codes_to_new_cell, parse_docstring=True)
+def write_codes_to_new_cell(codes: str, config: RunnableConfig) -> str:
     """
     Call this tool when you need to write codes into the jupyter notebbok.
 
@@ -111,13 +195,33 @@ def write_codes_to_new_cell(codes: str) -> str:
     Returns:
         str: status of the action, eight "success" or "fail: {reason}".
     """
-    # TODO: code validation before write codes. if codes are not executable, return "fail: {reason}""
+    client_id = notebook_context.client(_thread_id(config))
+    if client_id is None:
+        return f"fail: {NO_NOTEBOOK_CONTEXT}"
     validation_result = _validate_codes(codes)
     if validation_result == "success":
-        _write_codes_to_new_cell(codes)
+        _write_codes_to_new_cell(codes, client_id)
         return "success"
     else:
         return validation_result
 
 
 tools = [get_what_user_is_reading, get_user_codes, write_codes_to_new_cell, RAG_on_textbook]
+
+# How the Toolkit runs each tool. Reads are retried and reused within a turn,
+# writes are not idempotent. The notebook channel has its own timeout per
+# request.
+tool_policies = {
+    "get_what_user_is_reading":
+    ToolPolicy(timeout=NOTEBOOK_TIMEOUT + 1, retries=1, read_only=True),
+    "get_user_codes":
+    ToolPolicy(timeout=NOTEBOOK_TIMEOUT + 1, retries=1, read_only=True),
+    "write_codes_to_new_cell":
+    ToolPolicy(timeout=SANDBOX_TIMEOUT + NOTEBOOK_TIMEOUT + 1,
+               max_concurrency=SANDBOX_WORKERS),
+    "RAG_on_textbook":
+    ToolPolicy(timeout=float(os.getenv("PYTEACH_RAG_TIMEOUT", "15")),
+               max_concurrency=int(os.getenv("PYTEACH_RAG_CONCURRENCY", "8")),
+               retries=2,
+               read_only=True),
+}
@@ -1,19 +1,30 @@
 import os
+import json
+import asyncio
+from contextlib import asynccontextmanager
 import dashscope
 import langserve
 
 from dotenv import load_dotenv
 
-from fastapi import FastAPI, Body, Query
+from fastapi import FastAPI, Body, Query, Request
 from fastapi.responses import RedirectResponse, JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
+from sse_starlette.sse import EventSourceResponse
+from langchain_core.messages import AIMessageChunk
 
-from pyteach.agent import agent
+from pyteach.agent import agent, memory
 from pyteach.utils import (
     get_logger,
     clean_memory_by_thread,
     get_existing_memory_thread_ids,
 )
+from pyteach.utils.models import agent_registry, model_pool
+from pyteach.utils.notebook import notebook_channel, notebook_context
+from pyteach.utils.sandbox import sandbox_pool
+from pyteach.utils.rag_tool.search import retrieval_service
+from pyteach.utils.nodes import (guard_verdict_cache, teacher_toolkit,
+                                 tool_metrics)
 from pyteach.utils.TTS import TTSCallback, markdown_to_plain_text, SpeechSynthesizer
 
 logger = get_logger()
@@ -21,7 +32,45 @@ logger = get_logger()
 # Environment and API Key
 load_dotenv(".env")
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Create every agent variant once, so the init nodes skip Ollama
+    try:
+        await agent_registry.aregister_all()
+    except Exception as e:
+        logger.error(f"Error registering agents, will retry on demand: {e}")
+    # Load the models before taking traffic, see /ready
+    if os.getenv("PYTEACH_WARMUP", "1") == "1":
+        await agent_registry.awarm_up()
+    # Open the notebook connection now instead of on the first tool call
+    try:
+        await asyncio.to_thread(notebook_channel.connect)
+    except Exception as e:
+        logger.error(f"Error connecting to the notebook, will retry on demand: {e}")
+    # Start the code validation workers ahead of the first write
+    await asyncio.to_thread(sandbox_pool.start)
+    # Load the textbook index or open the cloud collection once
+    try:
+        await asyncio.to_thread(retrieval_service.start)
+        if retrieval_service.index is not None:
+            logger.info(f"Loaded the local textbook index "
+                        f"({len(retrieval_service.index)} chunks)")
+    except FileNotFoundError as e:
+        logger.error(f"Local textbook index not built, run "
+                     f"`python -m pyteach.utils.rag_tool.build`: {e}")
+    except Exception as e:
+        logger.error(f"Error starting the textbook retrieval, will retry on demand: {e}")
+    yield
+    notebook_channel.disconnect()
+    sandbox_pool.close()
+    teacher_toolkit.close()
+    retrieval_service.close()
+    # Stop the aiosqlite worker thread, otherwise the process hangs on exit
+    await memory.aclose()
+
+
+app = FastAPI(lifespan=lifespan)
 # Add CORS middleware to your FastAPI app
 app.add_middleware(
     CORSMiddleware,
@@ -47,8 +96,8 @@ def namespace_parser(namespace: tuple) -> str:
         raise Exception("Strange!!!")
 
 
-async def run_chat(input_data: dict):
-
+def parse_chat_input(input_data: dict):
+    """Build the graph input state and run config from a chat request."""
     # TODO: this should be aligned with the graph state !!!
     logger.debug(input_data)
     task_type = input_data.get("config",
@@ -78,12 +127,34 @@ async def run_chat(input_data: dict):
     thread_id = (input_data.get("config", {}).get("configurable",
                                                   {}).get("thread_id", "0"))
 
+    # Run the input guard concurrently with the teacher, see GraphConfig
+    speculative = (input_data.get("config", {}).get("configurable", {}).get(
+        "speculative", os.getenv("PYTEACH_SPECULATIVE_GUARD", "0") == "1"))
+
+    # Judge the teacher output window by window while it streams
+    output_guard = (input_data.get("config", {}).get("configurable", {}).get(
+        "output_guard", os.getenv("PYTEACH_OUTPUT_GUARD", "full")))
+
+    # The socket of the page the chat is opened in, whose active cell the
+    # tools read
+    client_id = input_data.get("config", {}).get("configurable",
+                                                 {}).get("client_id")
+    if client_id:
+        notebook_context.bind(thread_id, client_id)
+
     # Prepare the configuration for the model call
     config = {
         "configurable": {
             "thread_id": thread_id,
+            "speculative": speculative,
+            "output_guard": output_guard,
         }
     }
+    return input_state, config
+
+
+async def run_chat(input_data: dict):
+    input_state, config = parse_chat_input(input_data)
 
     # Stream the response
     response_messages = []
@@ -93,10 +164,10 @@ async def run_chat(input_data: dict):
     #     logger.info(f"event: {chunk['messages'][-1].content}")
     #     response_messages.append(chunk["messages"][-1].content)
     #     logger.debug(chunk)
-    for namespace, event in agent.stream(input_state,
-                                         config=config,
-                                         stream_mode="updates",
-                                         subgraphs=True):
+    async for namespace, event in agent.astream(input_state,
+                                                config=config,
+                                                stream_mode="updates",
+                                                subgraphs=True):
         for node, update in event.items():
             logger.debug(f"Update from {node}: {update}")
             if node == "__interrupt__":
@@ -115,8 +186,71 @@ async def run_chat(input_data: dict):
     return {"responses": response_messages}
 
 
+# Only tokens generated by these nodes are forwarded to the user. The
+# speculative teacher is not streamed token by token: its first answer is
+# produced before the input guard has judged the input.
+STREAMED_NODES = ("LLM Teacher",)
+MESSAGE_NODES = ("LLM Teacher", "Guard and Teacher")
+
+
+def sse_event(event: str, content: str = "", **kwargs) -> dict:
+    return {"event": event, "data": json.dumps({"content": content, **kwargs})}
+
+
+async def stream_chat(input_data: dict):
+    """Yield Server-Sent Events while the graph is running.
+
+    Events:
+        token: a piece of the teacher's answer, sent as soon as it is generated.
+            With the incremental output guard, a window of the answer sent as
+            soon as the guard has judged it safe.
+        message: the complete teacher message once its node has finished.
+        interrupt: a guard interruption; it replaces whatever was streamed.
+        error: the graph raised; the stream ends right after.
+        end: the graph has finished.
+    """
+    input_state, config = parse_chat_input(input_data)
+    incremental = config["configurable"]["output_guard"] == "incremental"
+    try:
+        async for namespace, mode, chunk in agent.astream(
+                input_state,
+                config=config,
+                stream_mode=["messages", "updates", "custom"],
+                subgraphs=True):
+            if mode == "custom":
+                yield sse_event("token", chunk["content"])
+                continue
+            if mode == "messages":
+                # Raw tokens have not been judged by the incremental guard
+                msg, metadata = chunk
+                if (not incremental
+                        and metadata.get("langgraph_node") in STREAMED_NODES
+                        and isinstance(msg, AIMessageChunk) and msg.content):
+                    yield sse_event("token", msg.content)
+                continue
+
+            for node, update in chunk.items():
+                if node == "__interrupt__":
+                    logger.debug(f"\n{namespace_parser(namespace)}")
+                    yield sse_event("interrupt",
+                                    update[0].value.content,
+                                    source=namespace_parser(namespace))
+                elif node in MESSAGE_NODES and update and update.get(
+                        "messages"):
+                    yield sse_event("message", update["messages"][-1].content)
+    except Exception as e:
+        logger.error(f"Error while streaming chat: {e}")
+        yield sse_event("error", str(e))
+        return
+    yield sse_event("end")
+
+
 @app.post("/chat/stream")
-async def chat_endpoint(input_data: dict = Body(...)):
+async def chat_endpoint(request: Request, input_data: dict = Body(...)):
+    # Clients asking for an event stream get the answer token by token;
+    # the others keep receiving the whole conversation turn as one JSON.
+    if "text/event-stream" in request.headers.get("accept", ""):
+        return EventSourceResponse(stream_chat(input_data))
     responses = await run_chat(input_data)
     return JSONResponse(content=responses)
 
@@ -147,6 +281,50 @@ async def delete_chat_history(thread_id: str):
                             content={"message": "Internal Server Error"})
 
 
+@app.get("/ready")
+async def readiness():
+    """Report whether every model used by the graph is loaded in Ollama and
+    the textbook can be searched."""
+    try:
+        models = await agent_registry.ahot_models()
+    except Exception as e:
+        return JSONResponse(status_code=503,
+                            content={
+                                "ready": False,
+                                "message": f"Ollama unavailable: {e}"
+                            })
+    try:
+        # No-op once started, retries a failed startup
+        await asyncio.to_thread(retrieval_service.start)
+        rag = {"ready": True, "backend": retrieval_service.backend}
+    except Exception as e:
+        rag = {
+            "ready": False,
+            "backend": retrieval_service.backend,
+            "message": f"Textbook retrieval unavailable: {e}"
+        }
+    ready = all(models.values()) and rag["ready"]
+    return JSONResponse(status_code=200 if ready else 503,
+                        content={
+                            "ready": ready,
+                            "models": models,
+                            "rag": rag
+                        })
+
+
+@app.get("/stats")
+async def get_stats():
+    """Cache statistics of the serving hot path."""
+    return JSONResponse(
+        content={
+            "models": model_pool.stats(),
+            "guard_verdicts": guard_verdict_cache.stats(),
+            "sandbox": sandbox_pool.stats(),
+            "tools": tool_metrics.stats(),
+            "rag": retrieval_service.stats(),
+        })
+
+
 # For TTS
 @app.get("/synthesize")
 async def synthesize(text: str = Query(...)):
@@ -0,0 +1,41 @@
+from pyteach.utils import cache
+from pyteach.utils.cache import LRUCache, text_key
+
+
+def test_least_recently_used_is_evicted():
+    lru = LRUCache(maxsize=2)
+    lru.set("a", 1)
+    lru.set("b", 2)
+    assert lru.get("a") == 1
+    lru.set("c", 3)
+    assert "b" not in lru
+    assert lru.get("a") == 1 and lru.get("c") == 3
+    assert lru.evictions == 1
+
+
+def test_entries_expire_after_ttl(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(cache.time, "monotonic", lambda: now[0])
+    lru = LRUCache(ttl=10)
+    lru.set("a", 1)
+    now[0] += 9
+    assert lru.get("a") == 1
+    now[0] += 2
+    assert lru.get("a", "expired") == "expired"
+    assert len(lru) == 0
+    assert lru.stats()["evictions"] == 1
+
+
+def test_stats():
+    lru = LRUCache()
+    lru.set("a", 1)
+    lru.get("a")
+    lru.get("b")
+    stats = lru.stats()
+    assert (stats["hits"], stats["misses"], stats["hit_rate"]) == (1, 1, 0.5)
+
+
+def test_text_key_normalizes_case_and_spaces():
+    assert text_key("m", "What  is\na Variable") == text_key(
+        "m", "what is a variable")
+    assert text_key("m", "x") != text_key("n", "x")
@@ -0,0 +1,50 @@
+import pytest
+
+from pyteach.utils.classifier import SEED_SAMPLES, TaskClassifier
+from pyteach.utils.structured_io import detectionToTaskType
+
+# TASK_CLASSIFIER_THRESHOLD of nodes.py
+THRESHOLD = 0.8
+
+
+@pytest.fixture(scope="module")
+def classifier():
+    return TaskClassifier().fit(SEED_SAMPLES)
+
+
+@pytest.mark.parametrize("text,label", SEED_SAMPLES)
+def test_seed_samples(classifier, text, label):
+    assert classifier.predict(text)[0] == label
+
+
+@pytest.mark.parametrize("text,label", [
+    ("can you comment my function?", "comment codes"),
+    ("please explain the lecture materials", "explain all materials"),
+    ("could you debug the cells?", "debug all codes"),
+    ("hello there", "unknown"),
+])
+def test_rules(classifier, text, label):
+    assert classifier.predict(text) == (label, 1.0)
+
+
+@pytest.mark.parametrize("text", [
+    "I have a comment about today",
+    "what does comment mean",
+    "can you fix my mood",
+    "explain yourself",
+])
+def test_no_routine_without_a_code_object(classifier, text):
+    # Either no routine at all, or not confident enough to skip the LLM
+    label, confidence = classifier.predict(text)
+    assert (detectionToTaskType[label] == "default_task"
+            or confidence < THRESHOLD)
+
+
+def test_add_sample_updates_centroids():
+    classifier = TaskClassifier().fit(SEED_SAMPLES)
+    before = classifier.predict("explain the turtle drawing")
+    for _ in range(3):
+        classifier.add_sample("explain the turtle drawing", "simple explain")
+    label, confidence = classifier.predict("explain the turtle drawing")
+    assert label == "simple explain"
+    assert confidence >= before[1]
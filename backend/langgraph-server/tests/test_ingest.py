@@ -0,0 +1,106 @@
+import os
+import json
+
+import numpy as np
+import pytest
+
+from pyteach.utils.rag_tool.index import LocalVectorIndex
+from pyteach.utils.rag_tool.ingest import ingest, parse_notebook
+
+
+def write_notebook(path, cells):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"cells": cells}, f)
+
+
+def markdown(source):
+    return {"cell_type": "markdown", "source": source}
+
+
+def code(source):
+    return {"cell_type": "code", "source": source}
+
+
+class CountingEmbedder:
+
+    def __init__(self):
+        self.texts = []
+
+    def __call__(self, texts):
+        self.texts.extend(texts)
+        return [[len(text), 1.0, float(i)] for i, text in enumerate(texts)]
+
+
+@pytest.fixture
+def corpus(tmp_path):
+    root = tmp_path / "files"
+    write_notebook(str(root / "chapter1" / "a.ipynb"), [
+        markdown("# Variables"),
+        code("x = 3\nprint(x)"),
+        markdown("## Names"),
+        markdown("Names start with a letter."),
+    ])
+    write_notebook(str(root / "chapter2" / "b.ipynb"), [
+        markdown("# Loops"),
+        code("for i in range(3):\n    print(i)"),
+    ])
+    return str(root), str(tmp_path / "index")
+
+
+def test_one_chunk_per_heading(corpus):
+    root, _ = corpus
+    chunks = parse_notebook(os.path.join(root, "chapter1", "a.ipynb"), root)
+    assert [chunk.id for chunk in chunks] == [
+        "chapter1/a.ipynb#0", "chapter1/a.ipynb#2"
+    ]
+    assert chunks[0].metadata["heading"] == "Variables"
+    assert "```python\nx = 3\nprint(x)\n```" in chunks[0].text
+    assert chunks[1].metadata["cell_types"] == ["markdown"]
+
+
+def test_only_changed_notebooks_are_embedded_again(corpus):
+    root, index_dir = corpus
+    embed = CountingEmbedder()
+    stats = ingest(embed, "test", root, index_dir)
+    assert (stats["changed"], stats["embedded_chunks"]) == (2, 3)
+
+    embed.texts.clear()
+    stats = ingest(embed, "test", root, index_dir)
+    assert (stats["unchanged"], stats["embedded_chunks"]) == (2, 0)
+    assert embed.texts == []
+
+    write_notebook(os.path.join(root, "chapter2", "b.ipynb"), [
+        markdown("# While loops"),
+        code("while False:\n    pass"),
+    ])
+    stats = ingest(embed, "test", root, index_dir)
+    assert (stats["unchanged"], stats["changed"]) == (1, 1)
+    assert len(embed.texts) == 1 and "While loops" in embed.texts[0]
+
+    index = LocalVectorIndex(index_dir)
+    assert len(index) == 3
+    assert index.model == "test"
+    # Carried-over vectors stay with their chunk
+    row = [chunk.id for chunk in index.chunks].index("chapter1/a.ipynb#0")
+    expected = np.array([len(index.chunks[row].text), 1.0, 0.0])
+    assert np.allclose(index.vectors[row],
+                       expected / np.linalg.norm(expected))
+
+
+def test_removed_notebooks_leave_the_index(corpus):
+    root, index_dir = corpus
+    ingest(CountingEmbedder(), "test", root, index_dir)
+    os.remove(os.path.join(root, "chapter2", "b.ipynb"))
+    stats = ingest(CountingEmbedder(), "test", root, index_dir)
+    assert stats["removed"] == 1
+    assert len(LocalVectorIndex(index_dir)) == 2
+
+
+def test_model_change_embeds_everything(corpus):
+    root, index_dir = corpus
+    ingest(CountingEmbedder(), "test", root, index_dir)
+    embed = CountingEmbedder()
+    stats = ingest(embed, "other", root, index_dir)
+    assert stats["embedded_chunks"] == 3
+    assert LocalVectorIndex(index_dir).model == "other"
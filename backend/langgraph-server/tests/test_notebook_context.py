@@ -0,0 +1,58 @@
+import asyncio
+
+import pytest
+
+from pyteach.utils import tools
+from pyteach.utils.notebook import NotebookContextCache, notebook_context
+
+
+def config(thread_id):
+    return {"configurable": {"thread_id": thread_id}}
+
+
+@pytest.fixture
+def requests(monkeypatch):
+    sent = []
+
+    async def arequest(task, timeout=None, **payload):
+        sent.append((task, payload))
+        return {
+            "jupyterlite_info": {
+                "ActiveCellContent": "x = 1",
+                "ActiveCellType": "code"
+            }
+        }
+
+    monkeypatch.setattr(tools.notebook_channel, "arequest", arequest)
+    yield sent
+    notebook_context.clear()
+
+
+def test_snapshots_are_per_client():
+    cache = NotebookContextCache()
+    cache.update_from_event({
+        "source_id": "Lecture_1",
+        "client_id": "a",
+        "jupyterlite_info": {"ActiveCellContent": "mine"}
+    })
+    cache.update_from_event({
+        "source_id": "Lecture_1",
+        "client_id": "b",
+        "jupyterlite_info": {"ActiveCellContent": "theirs"}
+    })
+    cache.bind("thread", "a")
+    assert cache.get("thread").content == "mine"
+    assert cache.get("unbound") is None
+
+
+def test_unbound_thread_does_not_ask_the_notebook(requests):
+    answer = asyncio.run(tools.get_user_codes.ainvoke({}, config("unbound")))
+    assert answer == tools.NO_NOTEBOOK_CONTEXT
+    assert requests == []
+
+
+def test_pull_goes_to_the_bound_client_only(requests):
+    notebook_context.bind("thread", "socket-1")
+    answer = asyncio.run(tools.get_user_codes.ainvoke({}, config("thread")))
+    assert answer.endswith("x = 1")
+    assert requests == [("getActiveCellContent", {"client_id": "socket-1"})]
@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+
+from pyteach.utils.rag_tool.bm25 import BM25Index
+from pyteach.utils.rag_tool.index import Chunk, build_local_index
+from pyteach.utils.rag_tool.providers import get_provider
+from pyteach.utils.rag_tool.search import (RetrievalService,
+                                           reciprocal_rank_fusion)
+
+TEXTS = [
+    "a variable stores a value under a name",
+    "a for loop repeats the body for every item of a list",
+    "a while loop repeats while its condition is true",
+    "print shows a value on the screen",
+]
+
+
+def test_reciprocal_rank_fusion():
+    scores = reciprocal_rank_fusion([["a", "b"], ["b", "c"]], k=60)
+    assert scores["b"] == pytest.approx(1 / 62 + 1 / 61)
+    assert scores["a"] == pytest.approx(1 / 61)
+    assert scores["c"] == pytest.approx(1 / 62)
+    assert max(scores, key=scores.get) == "b"
+
+
+def test_bm25_ranks_matching_documents():
+    bm25 = BM25Index.build(TEXTS)
+    rows, scores = bm25.search("while loop", 3)
+    assert list(rows[:2]) == [2, 1]
+    assert scores[0] > scores[1] > 0
+    # Only documents sharing a term are returned
+    assert set(rows) == {1, 2}
+    assert len(bm25.search("turtle", 3)[0]) == 0
+
+
+def test_bm25_round_trip(tmp_path):
+    bm25 = BM25Index.build(TEXTS)
+    bm25.save(str(tmp_path))
+    loaded = BM25Index.load(str(tmp_path))
+    assert np.allclose(loaded.scores("loop"), bm25.scores("loop"))
+
+
+@pytest.fixture(scope="module")
+def service(tmp_path_factory):
+    provider = get_provider("hashing")
+    chunks = [Chunk(id=str(i), text=text) for i, text in enumerate(TEXTS)]
+    path = str(tmp_path_factory.mktemp("index"))
+    build_local_index(chunks, provider.embed(TEXTS), path, model=provider.name)
+    service = RetrievalService("local", path, provider=provider, cache=None)
+    yield service
+    service.close()
+
+
+def test_hybrid_retrieval(service):
+    hits = service.retrieve("what does a while loop do", k=2, candidates=4)
+    assert [hit.id for hit in hits][0] == "2"
+    assert len(hits) == 2
+    assert hits[0].score >= hits[1].score
+
+
+def test_hybrid_retrieval_falls_back_to_vectors(service):
+    # No word in common with the corpus, the vector ranking still answers
+    hits = service.retrieve("zzz", k=2, candidates=4)
+    assert len(hits) == 2
@@ -0,0 +1,60 @@
+import pytest
+
+from pyteach.utils.sandbox import SandboxPool, static_check
+
+
+@pytest.fixture
+def pool():
+    pool = SandboxPool(size=1, timeout=2, memory_mb=256)
+    yield pool
+    pool.close()
+
+
+def test_runs_code(pool):
+    result = pool.run("print(1 + 1)")
+    assert result.ok
+    assert result.stdout == "2\n"
+
+
+def test_snippets_are_isolated(pool):
+    assert pool.run("import builtins\nbuiltins.print = None").ok
+    assert pool.run("import sys\nsys.modules['json'] = None").ok
+    result = pool.run("import json\nprint('after')")
+    assert result.ok, result.error
+    assert result.stdout == "after\n"
+
+
+def test_user_errors_are_reported_and_cached(pool):
+    code = "x = 1\nraise ValueError('boom')"
+    result = pool.run(code)
+    assert not result.ok
+    assert result.error == "ValueError: boom"
+    assert result.lineno == 2
+    assert pool.run(code) == result
+    assert pool.cache.hits == 1
+
+
+def test_timeout_is_not_cached(pool):
+    result = pool.run("while True: pass", timeout=0.5)
+    assert result.timed_out
+    assert len(pool.cache) == 0
+    assert pool.run("print('next')").ok
+
+
+def test_crash_is_not_cached(pool):
+    result = pool.run("import os\nos._exit(3)")
+    assert result.crashed
+    assert len(pool.cache) == 0
+
+
+def test_memory_limit(pool):
+    result = pool.run("x = bytearray(1024 * 1024 * 1024)")
+    assert not result.ok
+    assert result.error.startswith("MemoryError")
+
+
+def test_static_check():
+    assert static_check("print(x)").error == (
+        "NameError: name 'x' is not defined")
+    assert static_check("def f(:").stage == "static"
+    assert static_check("x = 1\nprint(x)") is None
@@ -0,0 +1,114 @@
+import time
+import asyncio
+
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+from langchain_core.tools import tool
+
+from pyteach.utils.prebuilt import ToolNode, ToolPolicy
+
+calls = []
+
+
+@tool
+def read(x: int) -> str:
+    """Read something."""
+    calls.append(("read", x))
+    return f"read {x}"
+
+
+@tool
+def write(x: int) -> str:
+    """Write something."""
+    calls.append(("write", x))
+    return f"wrote {x}"
+
+
+@tool
+def slow(x: int) -> str:
+    """Take a while."""
+    time.sleep(0.3)
+    return "done"
+
+
+@pytest.fixture(autouse=True)
+def reset_calls():
+    calls.clear()
+
+
+def ai(*tool_calls):
+    return AIMessage("",
+                     tool_calls=[{
+                         "name": name,
+                         "args": args,
+                         "id": f"{name}-{i}"
+                     } for i, (name, args) in enumerate(tool_calls)])
+
+
+@pytest.fixture
+def node():
+    node = ToolNode([read, write, slow],
+                    policies={
+                        "read": ToolPolicy(read_only=True),
+                        "slow": ToolPolicy(timeout=0.05, max_concurrency=1),
+                    })
+    yield node
+    node.close()
+
+
+def test_identical_calls_run_once(node):
+    messages = [HumanMessage("hi"), ai(("read", {"x": 1}), ("read", {"x": 1}))]
+    outputs = node.invoke({"messages": messages})["messages"]
+    assert calls == [("read", 1)]
+    assert [m.tool_call_id for m in outputs] == ["read-0", "read-1"]
+    assert [m.content for m in outputs] == ["read 1", "read 1"]
+
+
+def test_reads_are_reused_within_a_turn_until_a_write(node):
+    first = ai(("read", {"x": 1}))
+    result = ToolMessage("read 1", tool_call_id="read-0", name="read")
+    messages = [HumanMessage("hi"), first, result]
+    outputs = node.invoke({"messages": messages + [ai(("read", {"x": 1}))]})
+    assert calls == []
+    assert outputs["messages"][0].content == "read 1"
+
+    write_call = ai(("write", {"x": 2}))
+    written = ToolMessage("wrote 2", tool_call_id="write-0", name="write")
+    node.invoke({
+        "messages": messages + [write_call, written, ai(("read", {"x": 1}))]
+    })
+    assert calls == [("read", 1)]
+
+
+def test_reads_are_not_reused_across_turns(node):
+    messages = [
+        HumanMessage("hi"),
+        ai(("read", {"x": 1})),
+        ToolMessage("read 1", tool_call_id="read-0", name="read"),
+        HumanMessage("again"),
+        ai(("read", {"x": 1})),
+    ]
+    node.invoke({"messages": messages})
+    assert calls == [("read", 1)]
+
+
+def test_timeout(node):
+    outputs = node.invoke({"messages": [ai(("slow", {"x": 1}))]})["messages"]
+    assert outputs[0].status == "error"
+    assert "slow" in outputs[0].content
+
+
+def test_timed_out_call_keeps_its_concurrency_slot(node):
+    node.invoke({"messages": [ai(("slow", {"x": 1}))]})
+    # The first call is still running in its thread
+    limit = node._sync_limits["slow"]
+    assert not limit.acquire(blocking=False)
+    time.sleep(0.4)
+    assert limit.acquire(blocking=False)
+    limit.release()
+
+
+def test_async_timeout(node):
+    outputs = asyncio.run(
+        node.ainvoke({"messages": [ai(("slow", {"x": 1}))]}))["messages"]
+    assert outputs[0].status == "error"
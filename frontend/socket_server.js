@@ -22,9 +22,8 @@ io.on('connection', (socket) => {
       id = `${data.source_type}${data.source_id}`;
     }
     else if (data.source_type == "HOST") {
-      // Currently, any action from AS will be sent to all hostpages,
-      // regardless of lecture which. This can be improved by providing
-      // the source id of the host to the AS.
+      // Actions from AS without a client_id are sent to all hostpages,
+      // regardless of lecture which.
       id = `${data.source_type}`;
     }
     else {
@@ -41,16 +40,31 @@ io.on('connection', (socket) => {
 
   socket.on('from_AS_to_socket', (data) => {
     console.log('Socket INFO:\t', 'AS', data.source_id, 'to socket. Task=', data.task);
-    socket.to("HOST").emit("from_socket_to_host", data);
+    // Requests of a chat go to the page it is opened in only, so a student
+    // never gets another student's cell
+    socket.to(data.client_id || "HOST").emit("from_socket_to_host", data);
   });
 
   socket.on('from_host_to_socket', (data) => {
     console.log('Socket INFO:\t', 'HOST', data.source_id, 'to socket. Message=', data.message, '. Data=', data);
-    socket.to(data.target_id).emit("from_socket_to_AS", data);
+    socket.to(data.target_id).emit("from_socket_to_AS", { ...data, client_id: socket.id });
     io.in(data.target_id).socketsLeave(data.target_id)
   });
 
 
+  // The AS keeps a snapshot of every page's active cell, pushed on change.
+  // Pages of the same lecture share a source_id, the socket id tells the
+  // students apart.
+  socket.on('subscribe_notebook_context', () => {
+    console.log('Socket INFO:\t', socket.id, 'subscribed to notebook context.');
+    socket.join("NOTEBOOK_CONTEXT");
+  });
+
+  socket.on('notebook_context', (data) => {
+    socket.to("NOTEBOOK_CONTEXT").emit("notebook_context", { ...data, client_id: socket.id });
+  });
+
+
   // For http://localhost:3000/debug
   socket.on('join_room', (roomId) => {
     socket.join(roomId);
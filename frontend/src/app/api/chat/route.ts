@@ -48,6 +48,7 @@ export async function POST(req: Request) {
   const threadId = config.configurable.thread_id;
   console.log("[route.ts][POST] extracted thread_id:", threadId); // Log the extracted thread_id
   const task_type = config.configurable.task_type;
+  const client_id = config.configurable.client_id;
 
   // build payload for llm
   const postData = {
@@ -56,6 +57,7 @@ export async function POST(req: Request) {
       configurable: {
         thread_id: threadId, // Use the extracted thread_id
         task_type: task_type,
+        client_id: client_id,
       },
     },
     kwargs: {},
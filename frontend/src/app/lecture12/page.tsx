@@ -18,7 +18,7 @@ export default function Page() {
 
       <div className="w-2/5 h-full grid-rows-2">
         <LLMPanel socket={socket} host_info={host_info} sourceFile={sourceFile}/>
-        <ChatBot />
+        <ChatBot socket={socket} />
       </div>
     </div>
   );
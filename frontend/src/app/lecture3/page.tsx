@@ -30,7 +30,7 @@ export default function Page() {
 
       <div className="w-2/5 h-full grid-rows-2">
         <LLMPanel socket={socket} host_info={host_info} sourceFile={sourceFile} indexArray = {indexArray}/>
-        <ChatBot />
+        <ChatBot socket={socket} />
       </div>
     </div>
   );
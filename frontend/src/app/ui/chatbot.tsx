@@ -16,7 +16,7 @@ interface Message {
   content: string;
 }
 
-export default function ChatBot() {
+export default function ChatBot({ socket }: any) {
   const { input, handleInputChange, setInput } = useChat({
     api: "/api/chat",
     keepLastMessageOnError: true,
@@ -99,6 +99,7 @@ export default function ChatBot() {
         config: {
           configurable: {
             thread_id: threadId, // Include thread_id directly
+            client_id: socket?.id, // The notebook of this page, whose cell the tools read
           },
         },
         kwargs: {}, // Optional parameters
@@ -183,6 +184,7 @@ export default function ChatBot() {
       config: {
         configurable: {
           thread_id: threadId, // Include thread_id directly
+          client_id: socket?.id, // The notebook of this page, whose cell the tools read
           task_type: 'teach',
         },
       },
@@ -244,6 +246,7 @@ export default function ChatBot() {
       config: {
         configurable: {
           thread_id: threadId, // Include thread_id directly
+          client_id: socket?.id, // The notebook of this page, whose cell the tools read
           task_type: task_type,
         },
       },
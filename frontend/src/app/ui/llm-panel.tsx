@@ -135,6 +135,9 @@ const LLMPanel = ({ socket, host_info, sourceFile, indexArray}: any) => {
                 let host_msg = { message: 'Successfully write content to a new cell.'}
                 socket.emit("from_host_to_socket", { ...host_info, ...host_msg, ...jupyterlite_info, target_id: target_id })
             }
+            if (event.data.task == 'activeCellChanged') {
+                socket.emit("notebook_context", { ...host_info, ...jupyterlite_info })
+            }
         }
     });
 